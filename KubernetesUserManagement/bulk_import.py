@@ -0,0 +1,38 @@
+import json
+from itertools import islice
+
+
+def iter_records(request):
+    """Return an iterator of (record, error) pairs from a JSON array or an
+    NDJSON request body.
+
+    NDJSON bodies are read line by line, so large imports are never held in
+    memory as a whole.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        return _iter_ndjson(request.stream)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array or an NDJSON body')
+    return ((record, None) for record in data)
+
+
+def _iter_ndjson(stream):
+    for line in iter(stream.readline, b''):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError:
+            yield None, 'Invalid JSON'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,17 +1,99 @@
 from app import app, db, User
-from sqlalchemy import text
+from sqlalchemy import inspect, text
+from contextlib import contextmanager
+import argparse
+import logging
+import os
 
-def init_database():
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Arbitrary key shared by every bootstrap run, so concurrent pods take turns
+BOOTSTRAP_LOCK_KEY = 7245101
+
+@contextmanager
+def bootstrap_lock():
+    """Hold a Postgres advisory lock while bootstrapping; a no-op elsewhere."""
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+    with db.engine.connect() as conn:
+        logger.info("Waiting for bootstrap lock...")
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': BOOTSTRAP_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': BOOTSTRAP_LOCK_KEY})
+
+# Columns added to "user" after its first release. create_all() only creates
+# missing tables, so databases from older releases get them here.
+ADDED_USER_COLUMNS = ['namespace_status']
+
+def upgrade_schema():
+    """Add newer columns and indexes to an existing user table; safe to rerun."""
+    table = User.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    for name in ADDED_USER_COLUMNS:
+        if name not in existing:
+            column = table.columns[name]
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {name} {column_type}'))
+            logger.info(f"Added column {table.name}.{name}")
+    db.session.commit()
+    # Keyset pagination and filter indexes; skipped when already present
+    for index in table.indexes:
+        index.create(db.engine, checkfirst=True)
+
+def seed_default_users():
+    # Check if admin user exists
+    if User.query.filter_by(username='admin').first():
+        logger.info("Default users already present")
+        return
+
+    admin_user = User(
+        username='admin',
+        email='admin@example.com',
+        password=os.getenv('ADMIN_PASSWORD', 'admin123'),  # Change in production
+        role='admin'
+    )
+    db.session.add(admin_user)
+
+    # Add a test user
+    test_user = User(
+        username='test_user',
+        email='test@example.com',
+        password='test123',  # Change in production
+        role='user'
+    )
+    db.session.add(test_user)
+
+    db.session.commit()
+    logger.info("Database initialized with default users")
+
+def init_database(reset=False):
     with app.app_context():
-        # Drop all tables with CASCADE
-        db.session.execute(text('DROP TABLE IF EXISTS resource_quota CASCADE'))
-        db.session.execute(text('DROP TABLE IF EXISTS "user" CASCADE'))
-        db.session.commit()
-        
-        # Create all tables
-        db.create_all()
-        
-        print("Database tables created successfully!")
+        with bootstrap_lock():
+            try:
+                if reset:
+                    # Drop all tables with CASCADE
+                    db.session.execute(text('DROP TABLE IF EXISTS resource_quota CASCADE'))
+                    db.session.execute(text('DROP TABLE IF EXISTS "user" CASCADE'))
+                    db.session.commit()
+
+                # Create missing tables, then bring existing ones up to date
+                db.create_all()
+                upgrade_schema()
+                logger.info("Database tables created successfully")
+
+                seed_default_users()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error initializing database: {str(e)}")
+                raise
 
 if __name__ == "__main__":
-    init_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the schema and default users")
+    parser.add_argument("--reset", action="store_true",
+                      help="Drop existing tables before recreating them")
+    args = parser.parse_args()
+    init_database(reset=args.reset)
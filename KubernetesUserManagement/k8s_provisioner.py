@@ -0,0 +1,144 @@
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from opentelemetry import trace
+
+from tracing import extract_context, inject_context
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# Client errors that retrying won't fix (conflict is handled as success)
+NON_RETRYABLE_STATUSES = {400, 401, 403, 404, 422}
+
+
+def namespace_name(username):
+    """Map a username to a valid DNS-1123 namespace name."""
+    name = re.sub(r'[^a-z0-9-]+', '-', username.lower()).strip('-')
+    return f"user-{name}"[:63].rstrip('-')
+
+
+class NamespaceProvisioner:
+    """Creates user namespaces on a small background worker pool.
+
+    The Kubernetes API client is built once per process and reuses its
+    connection pool. Creation is idempotent (an existing namespace counts as
+    success) and failed attempts are retried with exponential backoff.
+    Progress is reported through ``on_status(username, status)`` with one of
+    provisioning, retrying, ready or failed; callers mark users pending
+    themselves when enqueuing. ``on_api_call(operation, outcome, seconds)``,
+    if given, is called after every Kubernetes API request.
+    """
+
+    def __init__(self, on_status, workers=2, max_attempts=5, backoff=1.0,
+                 max_backoff=30.0, pool_maxsize=4, api_host=None, on_api_call=None):
+        self.on_status = on_status
+        self.on_api_call = on_api_call
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_maxsize = pool_maxsize
+        self.api_host = api_host
+        self._api = None
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def core_api(self):
+        # The kubernetes package is slow to import, so load it on first use
+        from kubernetes import client, config
+
+        with self._lock:
+            if self._api is None:
+                configuration = client.Configuration()
+                if self.api_host:
+                    # e.g. a local fake API server during development
+                    configuration.host = self.api_host
+                else:
+                    try:
+                        config.load_incluster_config(client_configuration=configuration)
+                    except config.ConfigException:
+                        config.load_kube_config(client_configuration=configuration)
+                configuration.connection_pool_maxsize = self.pool_maxsize
+                self._api = client.CoreV1Api(client.ApiClient(configuration))
+            return self._api
+
+    def create_namespace(self, username):
+        from kubernetes import client
+        from kubernetes.client.rest import ApiException
+
+        name = namespace_name(username)
+        body = client.V1Namespace(metadata=client.V1ObjectMeta(name=name))
+        api = self.core_api()
+        with tracer.start_as_current_span('k8s.create_namespace', kind=trace.SpanKind.CLIENT,
+                                          attributes={'k8s.namespace.name': name}) as span:
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                api.create_namespace(body)
+                outcome = 'created'
+                logger.info(f"Created Kubernetes namespace for user: {username}")
+            except ApiException as e:
+                span.set_attribute('http.response.status_code', e.status)
+                if e.status != 409:
+                    raise
+                outcome = 'exists'
+                logger.info(f"Kubernetes namespace already exists for user: {username}")
+            finally:
+                span.set_attribute('k8s.outcome', outcome)
+                if self.on_api_call is not None:
+                    self.on_api_call('create_namespace', outcome, time.perf_counter() - started)
+
+    def _ensure_workers(self):
+        # Worker threads don't survive a fork, so each gunicorn worker starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._api = None
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'namespace-provisioner-{i}', daemon=True).start()
+
+    def enqueue(self, username):
+        self._ensure_workers()
+        # Carry the caller's trace context so provisioning joins the request's trace
+        self._queue.put((username, 1, inject_context()))
+
+    def _run(self):
+        while True:
+            username, attempt, carrier = self._queue.get()
+            try:
+                with tracer.start_as_current_span('namespace.provision', context=extract_context(carrier),
+                                                  attributes={'user.name': username, 'attempt': attempt}):
+                    self._provision(username, attempt, carrier)
+            except Exception as e:
+                logger.error(f"Error reporting namespace status for {username}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _provision(self, username, attempt, carrier):
+        self.on_status(username, 'provisioning')
+        try:
+            self.create_namespace(username)
+        except Exception as e:
+            # ApiException carries the HTTP status of the failed call
+            retryable = getattr(e, 'status', None) not in NON_RETRYABLE_STATUSES
+            if not retryable or attempt >= self.max_attempts:
+                logger.error(f"Giving up creating namespace for {username} after {attempt} attempts: {str(e)}")
+                self.on_status(username, 'failed')
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning(f"Error creating namespace for {username}, retrying in {delay:.1f}s: {str(e)}")
+            self.on_status(username, 'retrying')
+            timer = threading.Timer(delay, self._queue.put, args=((username, attempt + 1, carrier),))
+            timer.daemon = True
+            timer.start()
+            return
+        self.on_status(username, 'ready')
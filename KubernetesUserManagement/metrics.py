@@ -0,0 +1,117 @@
+"""Prometheus metrics for the user management service.
+
+When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py), every gunicorn
+worker writes its samples to that directory and /metrics aggregates them, so a
+scrape sees the whole pod rather than whichever worker answered.
+"""
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess)
+from sqlalchemy import event
+import os
+import time
+
+from server_timing import record
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+MULTIPROCESS = bool(MULTIPROC_DIR)
+if MULTIPROCESS:
+    # Metrics open their files in this directory on import, and entrypoints
+    # other than gunicorn (init_db.py, app.py, startup_report.py) never run
+    # the on_starting hook that creates it
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ['method', 'route', 'status']
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_duration_seconds', 'Password hash/verify time including queueing',
+    ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time',
+    ['statement']
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out_connections', 'Connections currently checked out of the pool',
+    multiprocess_mode='livesum'
+)
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections', 'Connections open beyond the pool size',
+    multiprocess_mode='livesum'
+)
+K8S_API_LATENCY = Histogram(
+    'k8s_api_call_duration_seconds', 'Kubernetes API call latency',
+    ['operation', 'outcome']
+)
+LOGIN_ATTEMPTS = Counter(
+    'login_attempts_total', 'Login attempts by outcome',
+    ['outcome']
+)
+
+LOGIN_REJECTED = Counter(
+    'login_rejected_total', 'Logins rejected before checking the password',
+    ['reason']
+)
+
+STATEMENT_TYPES = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+
+def statement_type(statement):
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else ''
+    return verb if verb in STATEMENT_TYPES else 'OTHER'
+
+
+def instrument_engine(engine):
+    """Time SQL statements (also into the request's Server-Timing db phase) and
+    track pool usage for a SQLAlchemy engine."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_LATENCY.labels(statement_type(statement)).observe(elapsed)
+            record('db', elapsed)
+
+    pool = engine.pool
+
+    def update_pool_gauges(*args):
+        if hasattr(pool, 'checkedout'):
+            DB_POOL_CHECKED_OUT.set(pool.checkedout())
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    event.listen(pool, 'checkout', update_pool_gauges)
+    event.listen(pool, 'checkin', update_pool_gauges)
+
+    # Pool events fire only after a connection was handed out, so time the
+    # wait by wrapping the pool's internal getter
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+
+
+def render():
+    """Return (body, content_type) for the /metrics endpoint."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,46 @@
+import base64
+import json
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque token."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Decode a cursor made by encode_cursor, checking it holds one value of
+    each type in ``types`` (the sort key of the requested order)."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Invalid cursor')
+    for value, expected in zip(values, types):
+        # bool is an int subclass, but never a valid key
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_limit(value, default=100, maximum=1000):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+
+def parse_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'Invalid boolean: {value}')
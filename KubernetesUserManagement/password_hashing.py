@@ -0,0 +1,225 @@
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+from opentelemetry import trace
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from server_timing import phase
+
+EWMA_ALPHA = 0.2
+
+tracer = trace.get_tracer(__name__)
+
+
+def _timed_call(fn, *args):
+    # Runs in the pool process; the start time lets the parent split queue
+    # wait from hashing time
+    return time.time(), fn(*args)
+
+
+class HashingQueueFull(Exception):
+    """Raised when every pool worker is busy and the wait queue is full, or
+    when an admitted hash doesn't finish within the timeout."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs password KDFs on a fixed-size process pool behind a bounded queue.
+
+    At most ``workers + queue_size`` hashes are admitted at once; further
+    requests fail fast with HashingQueueFull instead of tying up the web
+    worker. With ``workers=0`` hashes run inline in the calling process.
+    ``on_complete(operation, seconds)`` is called after every hash or verify
+    with the time spent including queueing.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=2, queue_size=8, timeout=10,
+                 on_complete=None):
+        self.method = method
+        self.on_complete = on_complete
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_seconds = 0.0
+        # Moving averages of time spent queued and time spent hashing
+        self.wait_ewma = 0.0
+        self.service_ewma = 0.0
+        self._in_flight = 0
+        self._normalized_method = None
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        # Pools and semaphores don't survive a fork, so gunicorn workers each
+        # build their own on first use
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                self._executor = None
+                self._in_flight = 0
+            if self._executor is None and self.workers > 0:
+                # Not fork: by now this worker runs threads (write-behind flusher,
+                # provisioner, trace exporter) whose held locks a forked child
+                # would inherit. Forkserver children start from a clean process.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver')
+                )
+            return self._executor
+
+    def _discard_pool(self, executor):
+        # A pool whose process died (e.g. OOM-killed) rejects all further
+        # work; drop it so the next hash builds a fresh one
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, operation, fn, *args, block=False):
+        executor = self._ensure_pool()
+        if block:
+            admitted = self._slots.acquire(timeout=self.timeout)
+        else:
+            admitted = self._slots.acquire(blocking=False)
+        if not admitted:
+            with self._lock:
+                self.rejected += 1
+            raise HashingQueueFull(self.retry_after())
+
+        with self._lock:
+            self._in_flight += 1
+        submitted = time.time()
+        future = Future()
+
+        def finished(inner):
+            # The slot is held until the hash really finishes, even if the caller stops waiting
+            finished_at = time.time()
+            elapsed = finished_at - submitted
+            started, result = submitted, None
+            if inner.exception() is None:
+                started, result = inner.result()
+            elif isinstance(inner.exception(), BrokenProcessPool):
+                self._discard_pool(executor)
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.wait_ewma += EWMA_ALPHA * (max(started - submitted, 0.0) - self.wait_ewma)
+                self.service_ewma += EWMA_ALPHA * (finished_at - started - self.service_ewma)
+            self._slots.release()
+            try:
+                if self.on_complete is not None:
+                    self.on_complete(operation, elapsed)
+            finally:
+                if inner.exception() is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(inner.exception())
+
+        if executor is None:
+            inner = Future()
+            try:
+                inner.set_result(_timed_call(fn, *args))
+            except Exception as e:
+                inner.set_exception(e)
+        else:
+            try:
+                inner = executor.submit(_timed_call, fn, *args)
+            except Exception as e:
+                with self._lock:
+                    self._in_flight -= 1
+                self._slots.release()
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_pool(executor)
+                raise
+        inner.add_done_callback(finished)
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Still an overload: the caller should back off like a rejected admission
+            with self._lock:
+                self.timed_out += 1
+            raise HashingQueueFull(self.retry_after())
+
+    def _run(self, operation, fn, *args, block=False):
+        with tracer.start_as_current_span(f'password.{operation}'), phase('hash'):
+            return self._result(self._submit(operation, fn, *args, block=block))
+
+    def hash(self, password, block=False):
+        return self._run('hash', generate_password_hash, password, self.method, block=block)
+
+    def hash_many(self, passwords):
+        """Hash a batch in parallel, keeping at most one job per pool process
+        in flight so the queue stays free for interactive logins."""
+        window = max(self.workers, 1)
+        hashes = []
+        with tracer.start_as_current_span('password.hash_many', attributes={'password.count': len(passwords)}), \
+                phase('hash'):
+            for start in range(0, len(passwords), window):
+                futures = [
+                    self._submit('hash', generate_password_hash, password, self.method, block=True)
+                    for password in passwords[start:start + window]
+                ]
+                hashes.extend(self._result(future) for future in futures)
+        return hashes
+
+    def verify(self, pwhash, password, block=False):
+        return self._run('verify', check_password_hash, pwhash, password, block=block)
+
+    def needs_rehash(self, pwhash):
+        """True if the stored hash was made with different KDF parameters."""
+        if self._normalized_method is None:
+            # Werkzeug fills in default parameters (e.g. "scrypt" ->
+            # "scrypt:32768:8:1"), so learn the canonical prefix once
+            with phase('hash'):
+                sample = generate_password_hash('', self.method)
+            self._normalized_method = sample.split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._normalized_method
+
+    def queue_latency(self):
+        """Estimated seconds a hash submitted now would wait for a process.
+
+        Derived from the current backlog rather than past waits, so it drops
+        as soon as the queue drains even if new requests are being shed.
+        """
+        with self._lock:
+            queued = max(self._in_flight - self.workers, 0)
+            return queued / max(self.workers, 1) * self.service_ewma
+
+    def retry_after(self):
+        with self._lock:
+            service = self.service_ewma or 1.0
+            backlog = self._in_flight / max(self.workers, 1)
+        return max(1, math.ceil(service * backlog))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'average_seconds': self.total_seconds / self.completed if self.completed else 0.0,
+                'wait_ewma_seconds': self.wait_ewma,
+                'service_ewma_seconds': self.service_ewma,
+            }
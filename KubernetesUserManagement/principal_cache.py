@@ -0,0 +1,85 @@
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+# What role_required needs to authorize a request, without the full User row
+Principal = namedtuple('Principal', ['id', 'role', 'is_active'])
+
+
+class PrincipalCache:
+    """Per-worker TTL + LRU cache of principals keyed by JWT identity."""
+
+    def __init__(self, ttl=30, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        # identity -> monotonic time of the last explicit invalidation, so that
+        # token claims minted before a role/active change are not trusted
+        self._invalidated_at = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, identity):
+        with self._lock:
+            entry = self._entries.get(identity)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[identity]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(identity)
+            self.hits += 1
+            return principal
+
+    def put(self, identity, principal):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[identity] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, identity):
+        with self._lock:
+            self._entries.pop(identity, None)
+            self._invalidated_at[identity] = time.monotonic()
+            self._invalidated_at.move_to_end(identity)
+            while len(self._invalidated_at) > self.maxsize:
+                self._invalidated_at.popitem(last=False)
+            self.invalidations += 1
+
+    def claims_usable(self, identity, issued_at):
+        """Token claims are trusted only while younger than the TTL and not
+        issued before a local invalidation of the same identity."""
+        age = time.time() - issued_at
+        if age < 0 or age >= self.ttl:
+            return False
+        with self._lock:
+            invalidated_at = self._invalidated_at.get(identity)
+        if invalidated_at is None:
+            return True
+        # Convert the wall-clock iat to this process' monotonic clock
+        return time.monotonic() - age > invalidated_at
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
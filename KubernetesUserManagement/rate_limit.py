@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import math
+import threading
+import time
+
+
+class InMemoryBackend:
+    """Token buckets held in this worker's memory, LRU-bounded by key count."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / rate
+        return allowed, retry_after
+
+
+class RedisBackend:
+    """Token buckets shared by every worker and pod through Redis.
+
+    Requires the optional ``redis`` package.
+    """
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def consume(self, key, rate, capacity, cost=1):
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[rate, capacity, time.time(), cost])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+
+
+class RateLimiter:
+    """Token bucket limiter: ``burst`` requests at once, refilled at ``rate`` per second."""
+
+    def __init__(self, backend, rate, burst):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+
+    def hit(self, key):
+        """Consume a token for ``key``; returns (allowed, retry_after_seconds)."""
+        allowed, retry_after = self.backend.consume(key, self.rate, self.burst)
+        return allowed, max(1, math.ceil(retry_after)) if not allowed else 0
@@ -3,6 +3,10 @@ import subprocess
 import sys
 import os
 import argparse
+import csv
+import json
+import time
+import urllib.request
 
 def run_unit_tests():
     """Run the unit tests"""
@@ -23,12 +27,147 @@ def run_load_tests(host="http://localhost:5001"):
         print("Errors:", result.stderr)
     return result.returncode
 
+BENCH_DIR = "benchmarks"
+SEEDED_USER_PREFIX = "loadtest_user_"
+
+def api_post(host, path, payload, token=None, content_type="application/json"):
+    headers = {"Content-Type": content_type}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    request = urllib.request.Request(f"{host}{path}", data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.loads(response.read())
+
+def seed_users(host, count, admin_password):
+    """Create the login users the benchmark picks from (existing ones are kept)"""
+    print(f"Seeding {count} load test users...")
+    token = api_post(host, "/api/login", {"username": "admin", "password": admin_password})["access_token"]
+    lines = "\n".join(json.dumps({
+        "username": f"{SEEDED_USER_PREFIX}{i}",
+        "email": f"{SEEDED_USER_PREFIX}{i}@example.com",
+        "password": "test123"
+    }) for i in range(count))
+    report = api_post(host, "/api/register/bulk", lines.encode(), token, "application/x-ndjson")
+    print(f"Seeded users: {report['created']} created, {report['failed']} already present or failed")
+
+def parse_locust_stats(path):
+    """Per-endpoint latency percentiles (ms) and throughput from a locust stats CSV"""
+    results = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            name = row["Name"] if row["Type"] else "Aggregated"
+            requests = int(row["Request Count"])
+            results[name] = {
+                "requests": requests,
+                "failures": int(row["Failure Count"]),
+                "failure_rate": int(row["Failure Count"]) / requests if requests else 0.0,
+                "rps": float(row["Requests/s"]),
+                "p50": float(row["50%"]),
+                "p95": float(row["95%"]),
+                "p99": float(row["99%"]),
+            }
+    return results
+
+def compare_to_baseline(results, baseline, threshold):
+    """List endpoints whose p95/p99 or RPS moved past the threshold, or that
+    started failing more often"""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        for metric in ("p95", "p99"):
+            if base[metric] and current[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {base[metric]:.0f}ms -> {current[metric]:.0f}ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {base['rps']:.2f} -> {current['rps']:.2f}")
+        if current["failure_rate"] > base["failure_rate"] + threshold:
+            regressions.append(f"{name}: failure rate {base['failure_rate']:.1%} -> {current['failure_rate']:.1%}")
+    return regressions
+
+def run_benchmark(args):
+    """Run locust headless with a fixed profile and gate on the stored baseline"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    if args.seed_users:
+        seed_users(args.host, args.seed_users, args.admin_password)
+
+    csv_prefix = os.path.join(BENCH_DIR, "locust")
+    env = dict(os.environ,
+               LOAD_TEST_SEED=str(args.seed),
+               LOAD_TEST_RUN_ID=str(int(time.time())),
+               LOAD_TEST_USER_COUNT=str(args.seed_users))
+    command = ["locust", "-f", "tests/test_load.py", "--host", args.host, "--headless",
+               "--users", str(args.users), "--spawn-rate", str(args.spawn_rate),
+               "--run-time", args.run_time, "--csv", csv_prefix, "--only-summary"]
+    print(f"Running benchmark: {' '.join(command)}")
+    # Output streams straight to the console
+    result = subprocess.run(command, env=env)
+    stats_path = f"{csv_prefix}_stats.csv"
+    if not os.path.exists(stats_path):
+        print("Errors: locust produced no stats")
+        return result.returncode or 1
+
+    results = parse_locust_stats(stats_path)
+    report = {
+        "profile": {"users": args.users, "spawn_rate": args.spawn_rate,
+                    "run_time": args.run_time, "seed": args.seed, "seed_users": args.seed_users},
+        "endpoints": results,
+    }
+    with open(args.results, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.results}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["profile"] != report["profile"]:
+        print(f"Warning: baseline profile {baseline['profile']} differs from this run")
+    regressions = compare_to_baseline(results, baseline["endpoints"], args.threshold)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%} of baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against baseline")
+    return 0
+
 def main():
     parser = argparse.ArgumentParser(description="Run tests for User Management System")
-    parser.add_argument("--type", choices=["unit", "load", "all"], default="all",
-                      help="Type of tests to run (unit, load, or all)")
+    parser.add_argument("--type", choices=["unit", "load", "bench", "all"], default="all",
+                      help="Type of tests to run (unit, load, bench, or all)")
     parser.add_argument("--host", default="http://localhost:5001",
                       help="Host to run load tests against")
+    bench = parser.add_argument_group("benchmark options (--type bench)")
+    bench.add_argument("--users", type=int, default=20,
+                      help="Number of simulated users")
+    bench.add_argument("--spawn-rate", type=float, default=5,
+                      help="Users started per second")
+    bench.add_argument("--run-time", default="60s",
+                      help="Benchmark duration, e.g. 60s or 5m")
+    bench.add_argument("--seed", type=int, default=42,
+                      help="Random seed for the generated users and task mix")
+    bench.add_argument("--seed-users", type=int, default=50,
+                      help="Login users to pre-seed through /api/register/bulk (0 to skip)")
+    bench.add_argument("--admin-password", default=os.getenv("ADMIN_PASSWORD", "admin123"),
+                      help="Admin password used for seeding")
+    bench.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"),
+                      help="Baseline results to compare against")
+    bench.add_argument("--results", default=os.path.join(BENCH_DIR, "latest.json"),
+                      help="Where to write this run's results")
+    bench.add_argument("--threshold", type=float, default=0.2,
+                      help="Allowed relative regression before failing (0.2 = 20%%)")
+    bench.add_argument("--update-baseline", action="store_true",
+                      help="Store this run as the new baseline instead of comparing")
     
     args = parser.parse_args()
     
@@ -47,6 +186,11 @@ def main():
         if load_result != 0:
             exit_code = load_result
     
+    if args.type == "bench":
+        bench_result = run_benchmark(args)
+        if bench_result != 0:
+            exit_code = bench_result
+    
     sys.exit(exit_code)
 
 if __name__ == "__main__":
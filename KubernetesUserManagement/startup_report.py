@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Report how long a fresh worker takes to import the app and serve its first request."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so nothing is already imported
+CHILD_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({'import_seconds': imported - started, 'first_request_seconds': served - started}))
+"""
+
+def parse_importtime(stderr):
+    """Parse `python -X importtime` output into (module, depth, self_s, cumulative_s) rows."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return modules
+
+def app_imports(modules):
+    """Modules imported directly by app.py; their cumulative time includes
+    everything they pull in. importtime lists children before their parent."""
+    children = []
+    for module in modules:
+        if module[1] == 0:
+            if module[0] == 'app':
+                return children
+            children = []
+        elif module[1] == 1:
+            children.append(module)
+    return []
+
+def collect():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        sys.exit(result.returncode)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['modules'] = parse_importtime(result.stderr)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup timing report for the User Management app")
+    parser.add_argument("--top", type=int, default=15,
+                      help="Number of slowest imports to list")
+    parser.add_argument("--json", action="store_true",
+                      help="Print the report as JSON")
+    parser.add_argument("--max-first-request", type=float,
+                      help="Exit non-zero if time to first request exceeds this many seconds")
+    args = parser.parse_args()
+
+    timings = collect()
+    slowest = sorted(app_imports(timings['modules']), key=lambda m: m[3], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            'import_seconds': timings['import_seconds'],
+            'first_request_seconds': timings['first_request_seconds'],
+            'slowest_imports': [{'module': name, 'self_seconds': own, 'cumulative_seconds': cumulative}
+                                for name, _, own, cumulative in slowest]
+        }, indent=2))
+    else:
+        print(f"Import app:            {timings['import_seconds']:.3f}s")
+        print(f"Time to first request: {timings['first_request_seconds']:.3f}s")
+        print("\nSlowest imports made by app.py:")
+        for name, _, own, cumulative in slowest:
+            print(f"  {cumulative:8.3f}s  (self {own:.3f}s)  {name}")
+
+    if args.max_first_request is not None and timings['first_request_seconds'] > args.max_first_request:
+        print(f"Time to first request exceeds {args.max_first_request:.3f}s", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,61 @@ from locust import HttpUser, task, between, events
 from faker import Faker
 import json
 import logging
+import os
+import random
+import requests
 
 fake = Faker()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Benchmark mode (run_tests.py --type bench) fixes the seed so every run makes
+# the same register/login mix, and pre-seeds LOAD_TEST_USER_COUNT login users
+SEED = os.getenv("LOAD_TEST_SEED")
+if SEED is not None:
+    Faker.seed(int(SEED))
+    random.seed(int(SEED))
+# Suffix for registered usernames, so repeated runs don't collide with earlier ones
+RUN_ID = os.getenv("LOAD_TEST_RUN_ID", "")
+SEEDED_USER_COUNT = int(os.getenv("LOAD_TEST_USER_COUNT", "0"))
+SEEDED_USER_PREFIX = "loadtest_user_"
+
+def new_user_payload():
+    username = fake.user_name()
+    email = fake.email()
+    if RUN_ID:
+        username = f"{username}_{RUN_ID}"
+        email = f"{RUN_ID}_{email}"
+    return {
+        "username": username,
+        "email": email,
+        "password": "test123",
+        "role": "user"
+    }
+
+def login_username():
+    if SEEDED_USER_COUNT:
+        return f"{SEEDED_USER_PREFIX}{random.randrange(SEEDED_USER_COUNT)}"
+    return "test_user"
+
 @events.test_start.add_listener
 def on_test_start(environment, **kwargs):
     """Initialize test data before load test starts"""
     if not environment.web_ui:
         logger.info("Starting load test...")
     
-    # Create initial test user if needed
-    with environment.runner.client.post("/api/login", 
-        json={
-            "username": "test_user",
-            "password": "test123"
-        },
-        catch_response=True) as response:
+    # Check that the login user exists
+    try:
+        response = requests.post(f"{environment.host}/api/login",
+            json={
+                "username": login_username(),
+                "password": "test123"
+            },
+            timeout=10)
         if response.status_code != 200:
             logger.warning("Test user doesn't exist, tests might fail")
+    except requests.RequestException as e:
+        logger.warning(f"Could not reach {environment.host}: {str(e)}")
 
 class UserBehavior(HttpUser):
     wait_time = between(1, 3)
@@ -31,6 +66,7 @@ class UserBehavior(HttpUser):
         """Login as admin to get token for protected routes"""
         try:
             with self.client.post("/api/login", 
+                name="UserBehavior: /api/login (admin)",
                 json={
                     "username": "admin",
                     "password": "admin123"
@@ -51,14 +87,9 @@ class UserBehavior(HttpUser):
             return
             
         try:
-            username = fake.user_name()
             with self.client.post("/api/register", 
-                json={
-                    "username": username,
-                    "email": fake.email(),
-                    "password": "test123",
-                    "role": "user"
-                },
+                name="UserBehavior: /api/register",
+                json=new_user_payload(),
                 headers={'Authorization': f'Bearer {self.admin_token}'},
                 catch_response=True) as response:
                 if response.status_code == 201:
@@ -75,8 +106,9 @@ class UserBehavior(HttpUser):
         """Simulate user login - higher frequency than registration"""
         try:
             with self.client.post("/api/login", 
+                name="UserBehavior: /api/login",
                 json={
-                    "username": "test_user",
+                    "username": login_username(),
                     "password": "test123"
                 },
                 catch_response=True) as response:
@@ -95,6 +127,7 @@ class UserBehavior(HttpUser):
             
         try:
             with self.client.get("/api/users",
+                name="UserBehavior: /api/users",
                 headers={'Authorization': f'Bearer {self.admin_token}'},
                 catch_response=True) as response:
                 if response.status_code == 200:
@@ -112,6 +145,7 @@ class AdminUser(HttpUser):
         """Login as admin"""
         try:
             with self.client.post("/api/login",
+                name="AdminUser: /api/login",
                 json={
                     "username": "admin",
                     "password": "admin123"
@@ -134,6 +168,7 @@ class AdminUser(HttpUser):
         try:
             # Get users list
             with self.client.get("/api/users",
+                name="AdminUser: /api/users",
                 headers={'Authorization': f'Bearer {self.admin_token}'},
                 catch_response=True) as response:
                 if response.status_code == 200:
@@ -143,14 +178,9 @@ class AdminUser(HttpUser):
             
             # Register new users
             for _ in range(3):
-                username = fake.user_name()
                 with self.client.post("/api/register",
-                    json={
-                        "username": username,
-                        "email": fake.email(),
-                        "password": "test123",
-                        "role": "user"
-                    },
+                    name="AdminUser: /api/register",
+                    json=new_user_payload(),
                     headers={'Authorization': f'Bearer {self.admin_token}'},
                     catch_response=True) as response:
                     if response.status_code == 201:
@@ -0,0 +1,92 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """Coalesces last_login timestamps in memory and flushes them in batches.
+
+    Only the newest timestamp per user is kept. A background thread hands the
+    pending batch to ``flush_fn`` every ``interval`` seconds, or sooner once
+    ``max_pending`` users are waiting, and once more at interpreter exit.
+    """
+
+    def __init__(self, flush_fn, interval=5.0, max_pending=500):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending = {}
+        thread = threading.Thread(target=self._run, name='last-login-flusher', daemon=True)
+        thread.start()
+        atexit.register(self.stop)
+
+    def record(self, user_id, timestamp):
+        with self._lock:
+            self._ensure_started()
+            current = self._pending.get(user_id)
+            if current is None or timestamp > current:
+                self._pending[user_id] = timestamp
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error flushing last_login updates: {str(e)}")
+                # Put the batch back unless a newer login superseded it
+                with self._lock:
+                    for user_id, timestamp in batch.items():
+                        current = self._pending.get(user_id)
+                        if current is None or timestamp > current:
+                            self._pending[user_id] = timestamp
+                return 0
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            return len(batch)
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'failures': self.failures,
+        }
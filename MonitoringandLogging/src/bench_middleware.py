@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Per-request overhead of the metrics and logging middleware.
+
+Calls the ASGI app directly (no sockets or HTTP client), so the numbers are
+the cost of the middleware stack itself. Log output goes to /dev/null.
+
+  python src/bench_middleware.py --requests 20000 --path /
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI
+from prometheus_client import CollectorRegistry
+
+from main import add_process_time_header, log_writer
+from metrics import setup_metrics
+
+
+def build_app(with_metrics, with_logging):
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return {"message": "Hello World"}
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    # Same order as main.py
+    if with_metrics:
+        setup_metrics(app, registry=CollectorRegistry())
+    if with_logging:
+        app.middleware("http")(add_process_time_header)
+    return app
+
+
+async def call(app, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app, path, requests):
+    for _ in range(min(1000, requests)):
+        await call(app, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Middleware overhead per request")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per variant")
+    parser.add_argument("--path", default="/", help="Path to request, e.g. / or /health (sampled logs)")
+    args = parser.parse_args()
+
+    log_writer.stream = open(os.devnull, "wb")
+    variants = [
+        ("bare", False, False),
+        ("metrics", True, False),
+        ("logging", False, True),
+        ("metrics+logging", True, True),
+    ]
+    print(f"{args.requests} requests to {args.path}")
+    print(f"{'variant':<16} {'us/request':>12} {'overhead us':>12}")
+    baseline = None
+    for name, with_metrics, with_logging in variants:
+        seconds = asyncio.run(measure(build_app(with_metrics, with_logging), args.path, args.requests))
+        baseline = seconds if baseline is None else baseline
+        print(f"{name:<16} {seconds * 1e6:>12.1f} {(seconds - baseline) * 1e6:>12.1f}")
+    log_writer.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# Gunicorn settings; worker count comes from WEB_CONCURRENCY (default 1)
+import glob
+import os
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Samples left over from a previous run would otherwise be aggregated
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauge files; its counters and histograms stay
+    # so totals don't go backwards
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,172 @@
+"""Queue-backed structlog pipeline.
+
+Processors on the event loop only build the event dict and put it on a
+bounded queue; a background thread renders records to JSON with orjson and
+writes them to stdout in batches. When the queue is full, records are dropped
+and counted rather than blocking a request.
+"""
+from datetime import datetime, timezone
+import atexit
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+import orjson
+import structlog
+
+from tracing import current_trace_ids
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    # The gauge below opens its file in this directory on import, and
+    # entrypoints other than gunicorn (python main.py, bench_middleware.py)
+    # never run the on_starting hook that creates it
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LOG_RECORDS = Counter(
+    "log_records_total", "Log records by outcome: queued, written, dropped (queue full) or sampled_out",
+    ["outcome"]
+)
+LOG_QUEUE_DEPTH = Gauge("log_queue_depth", "Log records waiting to be written", multiprocess_mode="livesum")
+
+
+def parse_sample_rates(value):
+    """Parse "path=rate,path=rate" into a dict, e.g. "/health=0.01,/metrics=0.01"."""
+    rates = {}
+    for rule in value.split(","):
+        if not rule.strip():
+            continue
+        path, rate = rule.split("=", 1)
+        rates[path.strip()] = float(rate)
+    return rates
+
+
+class RouteSampler:
+    """structlog processor keeping a fraction of request logs per path.
+
+    Records at warning level or above, with a status of 500 or more, or slower
+    than ``slow_seconds`` are always kept.
+    """
+
+    def __init__(self, rates, slow_seconds):
+        self.rates = rates
+        self.slow_seconds = slow_seconds
+
+    def __call__(self, logger, method_name, event_dict):
+        rate = self.rates.get(event_dict.get("path"))
+        if rate is None or rate >= 1:
+            return event_dict
+        if method_name in ("warning", "error", "critical", "exception"):
+            return event_dict
+        if event_dict.get("status_code", 0) >= 500 or event_dict.get("processing_time", 0) >= self.slow_seconds:
+            return event_dict
+        if random.random() < rate:
+            event_dict["sample_rate"] = rate
+            return event_dict
+        LOG_RECORDS.labels("sampled_out").inc()
+        raise structlog.DropEvent
+
+
+class QueueWriter:
+    """Final structlog processor: enqueue the event dict for the writer thread."""
+
+    def __init__(self, stream=None, queue_size=10000, batch_size=256):
+        self.stream = stream
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name, event_dict):
+        self._ensure_thread()
+        event_dict.setdefault("level", method_name)
+        try:
+            self._queue.put_nowait(event_dict)
+            LOG_RECORDS.labels("queued").inc()
+        except queue.Full:
+            LOG_RECORDS.labels("dropped").inc()
+        raise structlog.DropEvent
+
+    def _ensure_thread(self):
+        # Threads don't survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            threading.Thread(target=self._run, args=(self._queue,), name="log-writer", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self, records):
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            LOG_QUEUE_DEPTH.set(records.qsize())
+            for _ in batch:
+                records.task_done()
+
+    def _write(self, batch):
+        lines = []
+        for event_dict in batch:
+            event_dict["timestamp"] = datetime.fromtimestamp(event_dict["timestamp"], timezone.utc).isoformat()
+            lines.append(orjson.dumps(event_dict, default=str))
+        stream = self.stream or sys.stdout.buffer
+        try:
+            stream.write(b"\n".join(lines) + b"\n")
+            stream.flush()
+            LOG_RECORDS.labels("written").inc(len(batch))
+        except Exception:
+            LOG_RECORDS.labels("dropped").inc(len(batch))
+
+    def flush(self, timeout=2.0):
+        """Wait (up to ``timeout`` seconds) for queued records to be written."""
+        if self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def add_trace_ids(logger, method_name, event_dict):
+    # Links the record to the active span, when tracing is on
+    trace_id, span_id = current_trace_ids()
+    if trace_id:
+        event_dict["trace_id"] = trace_id
+        event_dict["span_id"] = span_id
+    return event_dict
+
+
+def add_timestamp(logger, method_name, event_dict):
+    # A float here; the writer thread formats it
+    event_dict["timestamp"] = time.time()
+    return event_dict
+
+
+def configure_logging(sample_rates=None, slow_seconds=0.5, queue_size=10000, batch_size=256):
+    """Route structlog through the queue; returns the QueueWriter."""
+    writer = QueueWriter(queue_size=queue_size, batch_size=batch_size)
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            add_trace_ids,
+            RouteSampler(sample_rates or {}, slow_seconds),
+            add_timestamp,
+            structlog.processors.format_exc_info,
+            writer,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(0),
+        cache_logger_on_first_use=True,
+    )
+    atexit.register(writer.flush)
+    return writer
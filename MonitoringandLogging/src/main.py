@@ -1,27 +1,69 @@
 import structlog
-from fastapi import FastAPI, Request
-from prometheus_fastapi_instrumentator import Instrumentator
-import time
+from fastapi import FastAPI, HTTPException, Request
+from logging_pipeline import configure_logging, parse_sample_rates
+from metrics import setup_metrics
+from profiling import install_profiler
+from server_timing import RouteStats, authorized, finish_request, start_request
+from tracing import configure_tracing
+import os
+import uuid
 
-# Configure structured logging
+# Configure structured logging: records are queued and written by a background thread
+log_writer = configure_logging(
+    # Fraction of request logs kept per path; errors and slow requests are always kept
+    sample_rates=parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "/health=0.01,/metrics=0.01")),
+    slow_seconds=float(os.getenv("LOG_SLOW_REQUEST_SECONDS", "0.5")),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "256")),
+)
 logger = structlog.get_logger()
 
+# Server-Timing response header, and requests per route kept for /timing/stats
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "true").lower() == "true"
+route_timings = RouteStats(window=int(os.getenv("SERVER_TIMING_WINDOW", "1000")))
+# Bearer token for /timing/stats; the route is hidden (404) without one
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 app = FastAPI(title="FastAPI Monitoring Demo")
 
 # Initialize Prometheus metrics
-Instrumentator().instrument(app).expose(app)
+setup_metrics(app)
+
+# GET /debug/profile, enabled by setting PROFILE_TOKEN
+install_profiler(app)
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    # Every log line of this request carries its id
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(request_id=request_id)
+    start_request()
+    try:
+        response = await call_next(request)
+    except Exception:
+        logger.exception(
+            "request_failed",
+            path=request.url.path,
+            method=request.method,
+            status_code=500,
+            processing_time=finish_request().total,
+        )
+        raise
+    timing = finish_request()
+    # The matched route's template; unmatched paths share one entry
+    route = request.scope.get("route")
+    route_timings.observe(f"{request.method} {route.path if route else 'unmatched'}", timing.total, timing.phases)
     logger.info(
         "request_processed",
         path=request.url.path,
         method=request.method,
-        processing_time=process_time,
+        status_code=response.status_code,
+        processing_time=timing.total,
     )
+    response.headers["X-Request-ID"] = request_id
+    if SERVER_TIMING_HEADER:
+        response.headers["Server-Timing"] = timing.header()
     return response
 
 @app.get("/")
@@ -33,6 +75,21 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/timing/stats")
+async def timing_stats(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(request.headers.get("Authorization"), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    # Percentiles for the worker that answers this request
+    return route_timings.summary()
+
+# Opt-in tracing (TRACING_ENABLED=true). Instrumented last so the server span
+# wraps the logging middleware and its records carry the trace ID.
+if configure_tracing("monitoring-demo"):
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics,debug/profile")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
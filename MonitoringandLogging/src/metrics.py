@@ -0,0 +1,41 @@
+"""Prometheus instrumentation for the demo app.
+
+With PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py), every worker writes
+its samples to files in that directory and /metrics aggregates them, so a
+scrape sees the whole container rather than whichever worker answered.
+"""
+from prometheus_fastapi_instrumentator import Instrumentator
+import os
+
+# http_request_duration_highr_seconds: all requests, no handler label, fine-grained
+DEFAULT_OVERALL_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 2.5, 3,
+                                   3.5, 4, 4.5, 5, 7.5, 10, 30, 60)
+# http_request_duration_seconds: per handler and method, so kept coarse
+DEFAULT_HANDLER_LATENCY_BUCKETS = (0.1, 0.5, 1)
+
+def parse_buckets(value, default):
+    """Parse a comma-separated list of bucket upper bounds, e.g. "0.1,0.5,1"."""
+    if not value:
+        return default
+    return tuple(sorted(float(bound) for bound in value.split(",") if bound.strip()))
+
+
+def setup_metrics(app, registry=None):
+    instrumentator = Instrumentator(
+        should_group_status_codes=True,
+        # Requests that match no route (404s, scanners) all share handler="none",
+        # so arbitrary paths can't create new series
+        should_group_untemplated=True,
+        excluded_handlers=["/metrics"],
+        registry=registry,
+    )
+    instrumentator.instrument(
+        app,
+        latency_highr_buckets=parse_buckets(os.getenv("METRICS_OVERALL_LATENCY_BUCKETS"),
+                                            DEFAULT_OVERALL_LATENCY_BUCKETS),
+        latency_lowr_buckets=parse_buckets(os.getenv("METRICS_HANDLER_LATENCY_BUCKETS"),
+                                           DEFAULT_HANDLER_LATENCY_BUCKETS),
+    )
+    # Aggregates PROMETHEUS_MULTIPROC_DIR when it is set
+    instrumentator.expose(app)
+    return instrumentator
@@ -1,11 +1,26 @@
 from flask import Flask, request, jsonify, render_template
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, event, insert, inspect, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
 from dotenv import load_dotenv
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from response_cache import LocalBackend, RedisBackend, ResponseCache
+from server_timing import RouteStats, authorized, finish_request, phase, record, start_request
+from tracing import configure_tracing, configure_logging
+import logging
 import os
+import random
+import time
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Log lines written inside a traced request carry its trace ID
+configure_logging(logging.INFO)
+
 app = Flask(__name__)
 
 # PostgreSQL configuration
@@ -15,59 +30,479 @@ db_host = os.environ.get('POSTGRES_HOST')
 db_port = os.environ.get('POSTGRES_PORT')
 db_name = os.environ.get('POSTGRES_DB')
 
-# Configure SQLAlchemy
-app.config['SQLALCHEMY_DATABASE_URI'] = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+# Configure SQLAlchemy; DATABASE_URL overrides the POSTGRES_* settings
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or \
+    f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Drop dead pooled connections (e.g. after a replica restart) before use
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+
+# Optional read replicas, comma-separated; GET routes read from them
+REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_BINDS = [f'replica{i}' for i in range(len(REPLICA_URLS))]
+app.config['SQLALCHEMY_BINDS'] = dict(zip(REPLICA_BINDS, REPLICA_URLS))
+# Seconds a client reads from the primary after its own write
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+# Seconds an unreachable replica is skipped before it is tried again
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+STICKY_COOKIE = 'read_primary_until'
 
 db = SQLAlchemy(app)
 
+# Opt-in tracing (TRACING_ENABLED=true): request spans plus a span per SQL
+# statement on the primary and every replica
+if configure_tracing('todo-app'):
+    from opentelemetry.instrumentation.flask import FlaskInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    FlaskInstrumentor().instrument_app(app)
+    with app.app_context():
+        # The instrumentation's declared SQLAlchemy range lags releases; the
+        # engine events it hooks are unchanged, so skip the version check
+        SQLAlchemyInstrumentor().instrument(engines=list(db.engines.values()), skip_dep_check=True)
+
+# Server-Timing: db and serialize phases per response, summarized per route at /timing/stats
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+route_timings = RouteStats(window=int(os.environ.get('SERVER_TIMING_WINDOW', '1000')))
+# Bearer token for /timing/stats; the route is hidden (404) without one
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify and app.json.dumps both end up here
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def time_queries(engine):
+    """Add each SQL statement's execution time to the request's db phase."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is not None:
+            record('db', time.perf_counter() - started)
+
+with app.app_context():
+    for engine in db.engines.values():
+        time_queries(engine)
+
+# Default and maximum page size for GET /todos
+DEFAULT_PAGE_SIZE = int(os.environ.get('TODOS_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = 1000
+
+# Deletions are kept for this many change versions; a client further behind
+# than that gets reset: true from /todos/changes and reloads the full list
+TOMBSTONE_RETENTION_VERSIONS = int(os.environ.get('TOMBSTONE_RETENTION_VERSIONS', '10000'))
+
+# Rendered GET /todos responses, keyed by the change version
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'local')  # local, redis or off
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '300'))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+if RESPONSE_CACHE_BACKEND == 'redis':
+    response_cache = ResponseCache(RedisBackend.from_url(REDIS_URL), ttl=RESPONSE_CACHE_TTL)
+elif RESPONSE_CACHE_BACKEND == 'local':
+    response_cache = ResponseCache(LocalBackend(RESPONSE_CACHE_SIZE), ttl=RESPONSE_CACHE_TTL)
+else:
+    response_cache = None
+
 # Todo Model
 class Todo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     completed = db.Column(db.Boolean, default=False)
+    # Change versions of the last write and of the insert, for /todos/changes
+    version = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+    created_version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    # Serves the completed filter in id order
+    __table_args__ = (db.Index('ix_todo_completed_id', 'completed', 'id'),)
 
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
-            'completed': self.completed
+            'completed': self.completed,
+            'version': self.version
         }
 
+# Records deleted todo ids so clients can sync deletions
+class TodoTombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    todo_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+
+# Single-row table holding the latest change version
+class ChangeCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+def next_version():
+    """Bump the change version inside the current transaction.
+
+    The UPDATE locks the counter row until commit, so writers take versions
+    in commit order and a client that has seen version N never misses a
+    change numbered N or lower.
+    """
+    version = db.session.execute(
+        update(ChangeCounter).where(ChangeCounter.id == 1)
+        .values(version=ChangeCounter.version + 1)
+        .returning(ChangeCounter.version)
+    ).scalar()
+    if version is None:
+        raise RuntimeError('Change counter row is missing; run init_db() via app.py')
+    return version
+
+def current_version(session=None):
+    session = session or db.session
+    return session.query(ChangeCounter.version).filter_by(id=1).scalar() or 0
+
+# Todo columns added after the first release; create_all() skips tables that
+# already exist, so init_db() adds them to older databases
+ADDED_TODO_COLUMNS = ['version', 'created_version']
+
+def upgrade_schema():
+    existing = {column['name'] for column in inspect(db.engine).get_columns('todo')}
+    table = Todo.__table__
+    with db.engine.begin() as conn:
+        for name in ADDED_TODO_COLUMNS:
+            if name not in existing:
+                # Existing rows start at version 0, the counter's initial value
+                column_type = table.c[name].type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE todo ADD COLUMN {name} {column_type} NOT NULL DEFAULT 0'))
+    for index in table.indexes:
+        index.create(db.engine, checkfirst=True)
+
+def init_db():
+    # Primary only; replicas receive the schema through replication
+    db.create_all(bind_key=None)
+    upgrade_schema()
+    if not db.session.get(ChangeCounter, 1):
+        db.session.add(ChangeCounter(id=1, version=0))
+        db.session.commit()
+
+# Monotonic time until which each replica is considered down
+replica_down_until = {}
+
+def reads_pinned_to_primary():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def connect_for_read():
+    """Return (bind, connection) for a read: a random healthy replica, or the
+    primary if there are none, they are all down, or this client wrote recently."""
+    if REPLICA_BINDS and not reads_pinned_to_primary():
+        now = time.monotonic()
+        for bind in random.sample(REPLICA_BINDS, len(REPLICA_BINDS)):
+            if replica_down_until.get(bind, 0) > now:
+                continue
+            try:
+                return bind, db.engines[bind].connect()
+            except OperationalError as e:
+                app.logger.warning(f"Replica {bind} unavailable, reading from primary: {e}")
+                replica_down_until[bind] = now + REPLICA_RETRY_SECONDS
+    return None, db.engine.connect()
+
+@contextmanager
+def read_session(primary=False):
+    """Session for read-only queries; ``session.info['bind']`` names the
+    replica it reads from, or is None for the primary."""
+    bind, connection = (None, db.engine.connect()) if primary else connect_for_read()
+    try:
+        with Session(bind=connection, info={'bind': bind}) as session:
+            yield session
+    finally:
+        connection.close()
+
+@app.after_request
+def pin_reads_after_write(response):
+    # Let the client read its own writes until the replicas have caught up
+    if REPLICA_BINDS and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        response.set_cookie(STICKY_COOKIE, str(time.time() + REPLICA_STICKY_SECONDS),
+                            max_age=int(REPLICA_STICKY_SECONDS) + 1, httponly=True, samesite='Lax')
+    return response
+
+@app.before_request
+def start_server_timing():
+    start_request()
+
+@app.after_request
+def add_server_timing(response):
+    timing = finish_request()
+    if timing is not None:
+        # URL rule, not raw path, so each route is one entry
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        route_timings.observe(f'{request.method} {route}', timing.total, timing.phases)
+        if SERVER_TIMING_HEADER:
+            response.headers['Server-Timing'] = timing.header()
+    return response
+
+@app.route('/timing/stats', methods=['GET'])
+def timing_stats():
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(request.headers.get('Authorization'), ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return jsonify(route_timings.summary())
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def row_to_dict(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'completed': row.completed
+    }
+
+def parse_bool(value):
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f'Invalid boolean: {value}')
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    limit = parse_int(value, 'limit')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
 @app.route('/todos', methods=['GET'])
 def get_todos():
-    todos = Todo.query.all()
-    return jsonify([todo.to_dict() for todo in todos])
+    try:
+        completed = parse_bool(request.args['completed']) if 'completed' in request.args else None
+        fetch_all = parse_bool(request.args.get('all', 'false'))
+        limit = parse_limit(request.args.get('limit'))
+        cursor = parse_int(request.args['cursor'], 'cursor') if 'cursor' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with read_session() as session:
+        return todos_response(session, completed, fetch_all, limit, cursor)
+
+def todos_response(session, completed, fetch_all, limit, cursor):
+    # Read the version before the rows: a change landing in between is also
+    # reported by /todos/changes, and applying it twice is harmless. Both come
+    # from the same database, so a lagging replica's pages are cached under
+    # its own (older) version
+    version = current_version(session)
+    if response_cache is None:
+        body, headers = render_todos(session, completed, fetch_all, limit, cursor)
+        return make_todos_response(body, headers, version)
+
+    key = ResponseCache.key(version, request.base_url + '?' + urlencode(sorted(request.args.items(multi=True))))
+    etag = ResponseCache.etag(key)
+    if request.if_none_match.contains(etag):
+        response_cache.not_modified(key)
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['X-Change-Version'] = str(version)
+        return response
+
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = render_todos(session, completed, fetch_all, limit, cursor)
+        response_cache.set(key, *entry)
+    response = make_todos_response(*entry, version)
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def render_todos(session, completed, fetch_all, limit, cursor):
+    """Return the (body, headers) of a GET /todos page."""
+    # Plain columns, no ORM entities
+    query = session.query(Todo.id, Todo.title, Todo.completed).order_by(Todo.id)
+    if completed is not None:
+        query = query.filter(Todo.completed == completed)
+
+    # The old unpaginated listing, only when explicitly asked for
+    if fetch_all:
+        return app.json.dumps([row_to_dict(row) for row in query]).encode(), {}
+
+    if cursor is not None:
+        query = query.filter(Todo.id > cursor)
+    rows = query.limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        # Keyset cursor: the last id on this page
+        next_args = request.args.to_dict()
+        next_args['cursor'] = rows[limit - 1].id
+        headers['X-Next-Cursor'] = str(rows[limit - 1].id)
+        headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return app.json.dumps([row_to_dict(row) for row in rows[:limit]]).encode(), headers
+
+def make_todos_response(body, headers, version):
+    response = app.response_class(body, mimetype='application/json')
+    response.headers.update(headers)
+    response.headers['X-Change-Version'] = str(version)
+    return response
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if response_cache is None:
+        return jsonify({'error': 'Response cache is disabled'}), 404
+    return jsonify(response_cache.stats())
+
+@app.route('/todos/changes', methods=['GET'])
+def get_todo_changes():
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since must be an integer version'}), 400
+
+    with read_session() as session:
+        version = current_version(session)
+        if since > version and session.info['bind'] is not None:
+            # The replica hasn't caught up with what this client has seen
+            session.close()
+            with read_session(primary=True) as primary:
+                return todo_changes_response(primary, since, current_version(primary))
+        return todo_changes_response(session, since, version)
+
+def todo_changes_response(session, since, version):
+    if since > version:
+        # The client is ahead of the server (e.g. the database was reset)
+        return jsonify({'version': version, 'reset': True})
+    if since < version - TOMBSTONE_RETENTION_VERSIONS:
+        # Tombstones the client still needs may already be pruned
+        return jsonify({'version': version, 'reset': True})
+
+    changed = session.query(Todo.id, Todo.title, Todo.completed, Todo.created_version) \
+        .filter(Todo.version > since).order_by(Todo.version).all()
+    deleted = session.query(TodoTombstone.todo_id) \
+        .filter(TodoTombstone.version > since).order_by(TodoTombstone.version).all()
+    return jsonify({
+        'version': version,
+        'inserted': [row_to_dict(row) for row in changed if row.created_version > since],
+        'updated': [row_to_dict(row) for row in changed if row.created_version <= since],
+        # Apply deletions before inserts/updates: SQLite may reuse a deleted id
+        'deleted': [row.todo_id for row in deleted]
+    })
 
 @app.route('/todos', methods=['POST'])
 def create_todo():
     data = request.get_json()
-    new_todo = Todo(title=data['title'])
+    version = next_version()
+    new_todo = Todo(title=data['title'], version=version, created_version=version)
     db.session.add(new_todo)
     db.session.commit()
     return jsonify(new_todo.to_dict()), 201
 
+def parse_ids(value):
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise ValueError('ids must be a list of integers')
+    return value
+
+def add_tombstones(todo_ids, version):
+    # One executemany, batched into multi-row INSERTs by SQLAlchemy
+    if todo_ids:
+        db.session.execute(insert(TodoTombstone), [{'todo_id': todo_id, 'version': version} for todo_id in todo_ids])
+        # Clients this far behind are reset, so older tombstones are never read
+        db.session.execute(
+            delete(TodoTombstone).where(TodoTombstone.version <= version - TOMBSTONE_RETENTION_VERSIONS)
+        )
+
 @app.route('/todos/<int:todo_id>', methods=['PUT'])
 def update_todo(todo_id):
-    todo = Todo.query.get_or_404(todo_id)
     data = request.get_json()
-    todo.completed = data.get('completed', todo.completed)
-    todo.title = data.get('title', todo.title)
+    values = {key: data[key] for key in ('title', 'completed') if key in data}
+    values['version'] = next_version()
+    # UPDATE ... RETURNING instead of a SELECT followed by the UPDATE
+    row = db.session.execute(
+        update(Todo).where(Todo.id == todo_id).values(**values)
+        .returning(Todo.id, Todo.title, Todo.completed, Todo.version)
+    ).first()
+    if row is None:
+        db.session.rollback()
+        return jsonify({'error': 'Todo not found'}), 404
     db.session.commit()
-    return jsonify(todo.to_dict())
+    return jsonify({**row_to_dict(row), 'version': row.version})
 
 @app.route('/todos/<int:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
-    todo = Todo.query.get_or_404(todo_id)
-    db.session.delete(todo)
+    version = next_version()
+    deleted = db.session.execute(delete(Todo).where(Todo.id == todo_id).returning(Todo.id)).scalar()
+    if deleted is None:
+        db.session.rollback()
+        return jsonify({'error': 'Todo not found'}), 404
+    add_tombstones([todo_id], version)
+    db.session.commit()
+    return jsonify({'id': todo_id, 'version': version})
+
+@app.route('/todos', methods=['PATCH'])
+def update_todos():
+    """Set ``completed`` on the todos in ``ids``, or on every todo with ``all: true``."""
+    data = request.get_json(silent=True) or {}
+    try:
+        completed = data.get('completed', True)
+        if not isinstance(completed, bool):
+            raise ValueError('completed must be a boolean')
+        ids = parse_ids(data['ids']) if 'ids' in data else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if ids is None and data.get('all') is not True:
+        return jsonify({'error': 'Provide ids or all: true'}), 400
+
+    version = next_version()
+    # Rows already in the requested state are left alone and keep their version
+    query = update(Todo).where(Todo.completed != completed)
+    if ids is not None:
+        query = query.where(Todo.id.in_(ids))
+    rows = db.session.execute(
+        query.values(completed=completed, version=version)
+        .returning(Todo.id, Todo.title, Todo.completed)
+    ).all()
+    if not rows:
+        db.session.rollback()
+        return jsonify({'version': current_version(), 'updated': []})
+    db.session.commit()
+    return jsonify({'version': version, 'updated': [row_to_dict(row) for row in rows]})
+
+@app.route('/todos', methods=['DELETE'])
+def delete_todos():
+    """Delete the todos in ``ids`` (JSON body), or those matching ``?completed=``."""
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_ids(data['ids']) if 'ids' in data else None
+        completed = parse_bool(request.args['completed']) if 'completed' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if ids is None and completed is None:
+        return jsonify({'error': 'Provide ids or a completed filter'}), 400
+
+    version = next_version()
+    query = delete(Todo)
+    if ids is not None:
+        query = query.where(Todo.id.in_(ids))
+    if completed is not None:
+        query = query.where(Todo.completed == completed)
+    deleted = db.session.execute(query.returning(Todo.id)).scalars().all()
+    if not deleted:
+        db.session.rollback()
+        return jsonify({'version': current_version(), 'deleted': []})
+    add_tombstones(deleted, version)
     db.session.commit()
-    return '', 204
+    return jsonify({'version': version, 'deleted': deleted})
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_db()
     app.run(host='0.0.0.0', port=5001) 
\ No newline at end of file
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+
+STATS = ('hits', 'misses', 'not_modified', 'bytes_saved')
+
+
+class LocalBackend:
+    """Responses cached in this process, LRU-bounded by entry count."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._stats = dict.fromkeys(STATS, 0)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        # Keys include the change version, so stale entries are never read
+        # again and simply age out of the LRU; no TTL needed
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def size(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return len(entry[0]) if entry is not None else None
+
+    def incr(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+class RedisBackend:
+    """Responses and counters shared by every pod through Redis.
+
+    Requires the optional ``redis`` package.
+    """
+
+    def __init__(self, client, prefix='todos:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        headers, body = value.split(b'\n', 1)
+        return body, json.loads(headers)
+
+    def set(self, key, entry, ttl):
+        body, headers = entry
+        # The body length is stored beside the entry so a 304 can count the
+        # bytes it saved without fetching the body
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, json.dumps(headers).encode() + b'\n' + body, ex=ttl)
+        pipe.set(self.prefix + key + ':size', len(body), ex=ttl)
+        pipe.execute()
+
+    def size(self, key):
+        value = self.client.get(self.prefix + key + ':size')
+        return int(value) if value is not None else None
+
+    def incr(self, stat, amount=1):
+        self.client.hincrby(self.prefix + 'stats', stat, amount)
+
+    def stats(self):
+        values = self.client.hgetall(self.prefix + 'stats')
+        return {stat: int(values.get(stat.encode(), 0)) for stat in STATS}
+
+
+class ResponseCache:
+    """Caches rendered response bodies under the todo change version.
+
+    Every mutation bumps the version, so a new version is a new set of keys
+    and nothing has to be purged. The ETag is derived from the version and
+    the request alone, which lets a matching If-None-Match be answered
+    without rendering or even looking up the body.
+    """
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def key(version, url):
+        return f"{version}:{hashlib.sha1(url.encode()).hexdigest()}"
+
+    @staticmethod
+    def etag(key):
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        self.backend.incr('hits' if entry is not None else 'misses')
+        return entry
+
+    def set(self, key, body, headers):
+        self.backend.set(key, (body, headers), self.ttl)
+
+    def not_modified(self, key):
+        self.backend.incr('not_modified')
+        size = self.backend.size(key)
+        if size is not None:
+            self.backend.incr('bytes_saved', size)
+
+    def stats(self):
+        stats = self.backend.stats()
+        lookups = stats['hits'] + stats['misses'] + stats['not_modified']
+        stats['hit_ratio'] = (stats['hits'] + stats['not_modified']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,226 @@
+"""On-demand sampling profiler for FastAPI apps.
+
+``install_profiler(app)`` adds ``GET /debug/profile?seconds=N``. For that
+window a background thread samples every thread's Python stack, and a task on
+the event loop measures scheduling lag. A wake-up that comes
+``slow_callback_ms`` or more late means a callback held the loop that long; it
+is reported together with the loop thread's most sampled stack during the
+stall. ``debug=true`` turns on asyncio's debug mode instead, which names each
+slow callback but slows every loop iteration, so it is opt-in. Nothing runs
+between requests, so the cost when idle is zero.
+
+The endpoint is off unless a token is configured (PROFILE_TOKEN), and then
+requires ``Authorization: Bearer <token>``. The default output is collapsed
+stacks, one ``frame;frame;frame count`` line per stack, ready for
+flamegraph.pl or speedscope; ``format=json`` adds the loop measurements.
+
+Copied from shared/profiling.py by shared/sync.py; edit that file.
+"""
+from collections import Counter
+import asyncio
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+SLOW_CALLBACK_PATTERN = re.compile(r"Executing (?P<callback>.+) took (?P<seconds>[\d.]+) seconds")
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of all other threads every ``interval`` seconds.
+
+    Samples of ``loop_thread`` are also kept in time order, so a stall found by
+    the lag probe can be matched to what the loop was running.
+    """
+
+    def __init__(self, interval, loop_thread=None):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.stacks = Counter()
+        self.loop_stacks = []
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._labels = {}
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] += 1
+                if thread_id == self.loop_thread:
+                    self.loop_stacks.append((time.perf_counter(), key))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def loop_stack_between(self, started, ended):
+        """The loop thread's most sampled stack between two perf_counter times, or None."""
+        stacks = Counter(stack for at, stack in self.loop_stacks if started <= at <= ended)
+        return stacks.most_common(1)[0][0] if stacks else None
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Collects asyncio's debug-mode "Executing ... took N seconds" warnings (``debug=true`` only)."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.callbacks = []
+
+    def emit(self, record):
+        match = SLOW_CALLBACK_PATTERN.search(record.getMessage())
+        if match:
+            self.callbacks.append({"callback": match["callback"], "seconds": float(match["seconds"])})
+
+
+async def measure_loop_lag(interval, stop):
+    """Sleep ``interval`` seconds repeatedly until ``stop`` is set; return
+    (wake-up time, how late it was) for each wake-up."""
+    wakeups = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        woke = time.perf_counter()
+        wakeups.append((woke, max(0.0, woke - started - interval)))
+    return wakeups
+
+
+def find_stalls(wakeups, sampler, slow_seconds):
+    """Late wake-ups of at least ``slow_seconds``, each with the loop's stack while it was blocked."""
+    started = wakeups[0][0] if wakeups else 0.0
+    return [
+        {
+            "seconds": lag,
+            "at_ms": (woke - lag - started) * 1000,
+            "stack": sampler.loop_stack_between(woke - lag, woke),
+        }
+        for woke, lag in wakeups
+        if lag >= slow_seconds
+    ]
+
+
+def summarize_lag(lags):
+    if not lags:
+        return {"samples": 0}
+    lags = sorted(lags)
+    return {
+        "samples": len(lags),
+        "mean_ms": sum(lags) / len(lags) * 1000,
+        "p99_ms": lags[max(0, int(len(lags) * 0.99) - 1)] * 1000,
+        "max_ms": lags[-1] * 1000,
+    }
+
+
+async def profile(seconds, interval=0.005, lag_interval=0.01, slow_callback_seconds=0.05, debug=False):
+    """Profile the running process for ``seconds``; returns (sampler, loop lags, slow callbacks).
+
+    Slow callbacks come from the lag probe unless ``debug`` is set, in which
+    case asyncio's debug mode reports them for the whole window.
+    """
+    loop = asyncio.get_running_loop()
+    if debug:
+        was_debug, slow_callback_duration = loop.get_debug(), loop.slow_callback_duration
+        handler = SlowCallbackHandler()
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(handler)
+        loop.slow_callback_duration = slow_callback_seconds
+        loop.set_debug(True)
+
+    sampler = StackSampler(interval, loop_thread=threading.get_ident())
+    stop = asyncio.Event()
+    sampler.start()
+    lag_task = asyncio.create_task(measure_loop_lag(lag_interval, stop))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        wakeups = await lag_task
+        await asyncio.to_thread(sampler.stop)
+        if debug:
+            loop.set_debug(was_debug)
+            loop.slow_callback_duration = slow_callback_duration
+            asyncio_logger.removeHandler(handler)
+    lags = [lag for _, lag in wakeups]
+    if debug:
+        return sampler, lags, handler.callbacks
+    return sampler, lags, find_stalls(wakeups, sampler, slow_callback_seconds)
+
+
+def install_profiler(app, token=None, max_seconds=None, path="/debug/profile"):
+    """Add the profiling endpoint to ``app``; a no-op without a token."""
+    token = token or os.getenv("PROFILE_TOKEN")
+    if not token:
+        return
+    max_seconds = max_seconds or float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    running = False
+
+    async def debug_profile(
+        request: Request,
+        seconds: float = Query(5.0, gt=0),
+        interval_ms: float = Query(5.0, ge=1, le=1000),
+        slow_callback_ms: float = Query(50.0, gt=0),
+        format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+        debug: bool = Query(False),
+    ):
+        nonlocal running
+        scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.encode(), token.encode()):
+            raise HTTPException(status_code=401, detail="Invalid profiling token")
+        if seconds > max_seconds:
+            raise HTTPException(status_code=400, detail=f"seconds must be at most {max_seconds:g}")
+        # One profile at a time; overlapping samplers would skew each other
+        if running:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+
+        running = True
+        try:
+            sampler, lags, slow_callbacks = await profile(
+                seconds, interval=interval_ms / 1000, slow_callback_seconds=slow_callback_ms / 1000,
+                debug=debug,
+            )
+        finally:
+            running = False
+        loop_lag = summarize_lag(lags)
+        if format == "json":
+            return JSONResponse({
+                "seconds": seconds,
+                "samples": sampler.samples,
+                "collapsed": sampler.collapsed(),
+                "loop_lag": loop_lag,
+                "slow_callbacks": slow_callbacks,
+            })
+        return PlainTextResponse(sampler.collapsed(), headers={
+            "X-Profile-Samples": str(sampler.samples),
+            "X-Loop-Lag-Max-Ms": f"{loop_lag.get('max_ms', 0.0):.1f}",
+            "X-Slow-Callbacks": str(len(slow_callbacks)),
+        })
+
+    app.add_api_route(path, debug_profile, methods=["GET"], include_in_schema=False)
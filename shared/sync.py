@@ -0,0 +1,56 @@
+"""Copy the shared modules into the services that use them.
+
+Usage:
+  python shared/sync.py          # overwrite the copies
+  python shared/sync.py --check  # exit 1 if any copy differs, for CI
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module in shared/ -> service directories that carry a copy
+COPIES = {
+    "profiling.py": ["terraform-mongodb/backend", "MonitoringandLogging/src"],
+    "server_timing.py": ["KubernetesUserManagement", "flask-postgres-k8s", "terraform-mongodb/backend",
+                         "MonitoringandLogging/src"],
+    "tracing.py": ["KubernetesUserManagement", "flask-postgres-k8s", "terraform-mongodb/backend",
+                   "MonitoringandLogging/src"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="report stale copies instead of writing them")
+    args = parser.parse_args()
+
+    stale = []
+    for name, directories in COPIES.items():
+        with open(os.path.join(ROOT, "shared", name), "rb") as f:
+            source = f.read()
+        for directory in directories:
+            path = os.path.join(ROOT, directory, name)
+            try:
+                with open(path, "rb") as f:
+                    current = f.read()
+            except FileNotFoundError:
+                current = None
+            if current == source:
+                continue
+            relative = os.path.relpath(path, ROOT)
+            stale.append(relative)
+            if not args.check:
+                with open(path, "wb") as f:
+                    f.write(source)
+                print(f"updated {relative}")
+
+    if args.check and stale:
+        for path in stale:
+            print(f"{path} differs from shared/; run python shared/sync.py", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""OpenTelemetry tracing shared by the services in this repo.
+
+``configure_tracing(service_name)`` installs a tracer provider when
+TRACING_ENABLED=true; otherwise the OpenTelemetry API stays a no-op and
+manual spans cost next to nothing. Trace context travels between services in
+W3C ``traceparent`` headers (the OpenTelemetry default propagator).
+
+Sampling is done twice. The head decision keeps TRACE_SAMPLE_RATIO of new
+traces and is honoured for incoming ``traceparent`` headers. Traces it skips
+are still recorded in memory, and when their local root span ends the tail
+decision exports them anyway if they took TRACE_SLOW_SECONDS or longer or any
+span failed. Kept spans are exported in batches from a background thread,
+either as JSON lines to TRACE_FILE (TRACE_EXPORTER=file, the default) or to an
+OTLP collector (TRACE_EXPORTER=otlp, needs the optional
+``opentelemetry-exporter-otlp-proto-http`` package).
+
+Copied from shared/tracing.py by shared/sync.py; edit that file.
+"""
+from collections import OrderedDict
+import logging
+import os
+import threading
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import (Decision, ParentBased, Sampler, SamplingResult,
+                                              TraceIdRatioBased)
+from opentelemetry.trace import StatusCode
+
+LOG_FORMAT = "%(levelname)s:%(name)s:%(message)s%(trace_context)s"
+
+
+class RecordingRatioSampler(Sampler):
+    """Ratio sampler whose rejected traces are recorded but not sampled, so
+    the tail sampler can still keep them."""
+
+    def __init__(self, ratio):
+        self._ratio = TraceIdRatioBased(ratio)
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None,
+                      links=None, trace_state=None):
+        result = self._ratio.should_sample(parent_context, trace_id, name, kind, attributes, links)
+        if result.decision == Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes,
+                                  trace.get_current_span(parent_context).get_span_context().trace_state)
+        return result
+
+    def get_description(self):
+        return f"RecordingRatioSampler{{{self._ratio.rate}}}"
+
+
+class RecordOnlySampler(Sampler):
+    """Used below unsampled parents: record for the tail decision only."""
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None,
+                      links=None, trace_state=None):
+        return SamplingResult(Decision.RECORD_ONLY, attributes,
+                              trace.get_current_span(parent_context).get_span_context().trace_state)
+
+    def get_description(self):
+        return "RecordOnlySampler"
+
+
+def head_sampler(ratio):
+    record_only = RecordOnlySampler()
+    return ParentBased(
+        root=RecordingRatioSampler(ratio),
+        remote_parent_not_sampled=record_only,
+        local_parent_not_sampled=record_only,
+    )
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """Buffers each trace's spans until its local root ends, then exports the
+    trace if it was head-sampled, slow or contains an error.
+
+    At most ``max_traces`` unfinished traces are buffered; the oldest are
+    dropped beyond that. Decisions are remembered for a while so spans that
+    end after their root (background work) follow the same decision.
+    """
+
+    def __init__(self, exporter, slow_seconds=0.5, max_traces=2048, batch_size=512,
+                 export_interval=2.0):
+        self.exporter = exporter
+        self.slow_nanos = int(slow_seconds * 1e9)
+        self.max_traces = max_traces
+        self.batch_size = batch_size
+        self.export_interval = export_interval
+        self.kept = 0
+        self.discarded = 0
+        self._pending = OrderedDict()
+        self._decisions = OrderedDict()
+        self._batch = []
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._pid = None
+        self._shutdown = False
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span):
+        trace_id = span.context.trace_id
+        with self._lock:
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                if decision:
+                    self._enqueue([span])
+                return
+            spans = self._pending.get(trace_id)
+            if spans is None:
+                spans = self._pending[trace_id] = []
+                while len(self._pending) > self.max_traces:
+                    self._pending.popitem(last=False)
+                    self.discarded += 1
+            spans.append(span)
+            # A local root has no parent, or a parent in another process
+            if span.parent is not None and not span.parent.is_remote:
+                return
+            del self._pending[trace_id]
+            keep = self._keep(span, spans)
+            self._decisions[trace_id] = keep
+            while len(self._decisions) > self.max_traces * 4:
+                self._decisions.popitem(last=False)
+            if keep:
+                self.kept += 1
+                self._enqueue(spans)
+            else:
+                self.discarded += 1
+
+    def _keep(self, root, spans):
+        if root.context.trace_flags.sampled:
+            return True
+        if root.end_time - root.start_time >= self.slow_nanos:
+            return True
+        return any(s.status.status_code == StatusCode.ERROR for s in spans)
+
+    def _enqueue(self, spans):
+        # Called with the lock held
+        self._ensure_thread()
+        self._batch.extend(spans)
+        if len(self._batch) >= self.batch_size:
+            self._ready.notify()
+
+    def _ensure_thread(self):
+        # Threads don't survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._batch = []
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._batch and not self._shutdown:
+                    self._ready.wait(self.export_interval)
+                batch, self._batch = self._batch, []
+                done = self._shutdown
+            self._export(batch)
+            if done:
+                return
+
+    def _export(self, batch):
+        for start in range(0, len(batch), self.batch_size):
+            try:
+                self.exporter.export(batch[start:start + self.batch_size])
+            except Exception:
+                logging.getLogger(__name__).exception("Exporting spans failed")
+
+    def force_flush(self, timeout_millis=30000):
+        with self._lock:
+            batch, self._batch = self._batch, []
+        self._export(batch)
+        return True
+
+    def shutdown(self):
+        self.force_flush()
+        with self._lock:
+            self._shutdown = True
+            self._ready.notify()
+        self.exporter.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return {"kept": self.kept, "discarded": self.discarded, "buffered": len(self._pending)}
+
+
+def build_exporter(kind, path):
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            raise RuntimeError("TRACE_EXPORTER=otlp requires the 'opentelemetry-exporter-otlp-proto-http' package")
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        return OTLPSpanExporter()
+    # One JSON span per line; appends, so several workers can share the file
+    return ConsoleSpanExporter(
+        out=open(path, "a", buffering=1),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+
+
+def configure_tracing(service_name):
+    """Install the tracer provider; returns it, or None when tracing is off."""
+    if os.getenv("TRACING_ENABLED", "false").lower() != "true":
+        return None
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", service_name)}),
+        sampler=head_sampler(float(os.getenv("TRACE_SAMPLE_RATIO", "0.1"))),
+    )
+    processor = TailSamplingProcessor(
+        build_exporter(os.getenv("TRACE_EXPORTER", "file"), os.getenv("TRACE_FILE", "traces.jsonl")),
+        slow_seconds=float(os.getenv("TRACE_SLOW_SECONDS", "0.5")),
+        max_traces=int(os.getenv("TRACE_MAX_BUFFERED", "2048")),
+    )
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+def current_trace_ids():
+    """(trace_id, span_id) of the active span as hex strings, or (None, None)."""
+    context = trace.get_current_span().get_span_context()
+    if not context.is_valid:
+        return None, None
+    return format(context.trace_id, "032x"), format(context.span_id, "016x")
+
+
+def inject_context():
+    """Carrier dict holding the current trace context, for handing work to another thread."""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(carrier):
+    return propagate.extract(carrier or {})
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds ``trace_id``/``span_id`` to log records and a ready-made
+    ``trace_context`` suffix for format strings."""
+
+    def filter(self, record):
+        trace_id, span_id = current_trace_ids()
+        record.trace_id, record.span_id = trace_id, span_id
+        record.trace_context = f" trace_id={trace_id} span_id={span_id}" if trace_id else ""
+        return True
+
+
+def configure_logging(level=logging.INFO):
+    """``logging.basicConfig`` with trace IDs appended to every line logged inside a span."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceContextFilter())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Concurrency benchmark: synchronous pymongo vs motor inside async routes.
+
+Both apps serve the same GET /items/{item_id} lookup and run in-process on
+one event loop, like a single uvicorn worker:
+
+  blocking  the old handler, calling pymongo's MongoClient from `async def`
+  motor     the same handler awaiting motor, as main.py now does
+
+Needs a reachable mongod (MONGO_URI) and httpx (`pip install httpx`). Items
+are written to a separate database that is dropped afterwards.
+
+  python benchmark.py --requests 2000 --concurrency 50 --delay-ms 5
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from bson.objectid import ObjectId
+from fastapi import FastAPI, HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from main import MONGO_MAX_POOL_SIZE, MONGO_URI
+
+
+def lookup(item_id, delay_ms):
+    query = {"_id": ObjectId(item_id)}
+    if delay_ms:
+        # Server-side sleep standing in for a slow query (needs JavaScript enabled in mongod)
+        query["$where"] = f"sleep({delay_ms}) || true"
+    return query
+
+
+def blocking_app(db_name, delay_ms):
+    client = MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    db = client.get_database(db_name)
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        item = db.items.find_one(lookup(item_id, delay_ms))
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        item["_id"] = str(item["_id"])
+        return item
+
+    return app, client
+
+
+def motor_app(db_name, delay_ms):
+    client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    db = client.get_database(db_name)
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        item = await db.items.find_one(lookup(item_id, delay_ms))
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        item["_id"] = str(item["_id"])
+        return item
+
+    return app, client
+
+
+async def run(factory, db_name, delay_ms, item_ids, total, concurrency):
+    # Build the app inside the loop it will be served on
+    app, mongo = factory(db_name, delay_ms)
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker(client):
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(f"/items/{random.choice(item_ids)}")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up the connection pool
+        await asyncio.gather(*(client.get(f"/items/{item_ids[0]}") for _ in range(concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    mongo.close()
+
+    latencies.sort()
+    return {
+        "throughput": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blocking pymongo vs motor throughput")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--items", type=int, default=1000, help="Items to seed")
+    parser.add_argument("--delay-ms", type=int, default=0,
+                        help="Simulated server-side query time per lookup")
+    parser.add_argument("--db", default="benchmark", help="Scratch database (dropped afterwards)")
+    args = parser.parse_args()
+
+    seed = MongoClient(MONGO_URI)
+    seed.drop_database(args.db)
+    result = seed[args.db].items.insert_many(
+        [{"name": f"item-{i}", "description": None, "price": i * 0.5, "quantity": i}
+         for i in range(args.items)]
+    )
+    item_ids = [str(item_id) for item_id in result.inserted_ids]
+
+    try:
+        print(f"{args.requests} requests, concurrency {args.concurrency}, delay {args.delay_ms}ms")
+        print(f"{'mode':<10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for name, factory in (("blocking", blocking_app), ("motor", motor_app)):
+            stats = asyncio.run(run(factory, args.db, args.delay_ms, item_ids,
+                                    args.requests, args.concurrency))
+            print(f"{name:<10} {stats['throughput']:>10.1f} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+    finally:
+        seed.drop_database(args.db)
+        seed.close()
+
+
+if __name__ == "__main__":
+    main()
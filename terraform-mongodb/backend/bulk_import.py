@@ -0,0 +1,99 @@
+import json
+
+import bson
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson")
+
+
+async def iter_ndjson(chunks, max_line_bytes):
+    """Yield (record, error) pairs from an async stream of NDJSON bytes.
+
+    Only one line is buffered at a time; a line longer than ``max_line_bytes``
+    is reported as an error and skipped.
+    """
+    buffer = b""
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            if line.strip():
+                yield parse_line(line, max_line_bytes)
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield None, "Line too long"
+            skipping = True
+            buffer = b""
+    if buffer.strip() and not skipping:
+        yield parse_line(buffer, max_line_bytes)
+
+
+def parse_line(line, max_line_bytes):
+    if len(line) > max_line_bytes:
+        return None, "Line too long"
+    try:
+        return json.loads(line), None
+    except ValueError:
+        return None, "Invalid JSON"
+
+
+async def iter_list(records):
+    for record in records:
+        yield record, None
+
+
+async def insert_records(collection, records, parse, batch_size, batch_bytes):
+    """Insert documents from (record, error) pairs with unordered insert_many.
+
+    ``parse(record)`` returns the document to store or raises ValueError.
+    Documents are BSON-encoded once, here, so each batch is capped by its
+    encoded size as well as its length and pymongo sends the bytes as-is.
+    Returns (inserted_count, errors) with errors as {"index", "error"} dicts.
+    """
+    inserted = 0
+    errors = []
+    batch, indexes, size = [], [], 0
+
+    async def flush():
+        nonlocal inserted
+        try:
+            result = await collection.insert_many(batch, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details["nInserted"]
+            for write_error in e.details["writeErrors"]:
+                errors.append({"index": indexes[write_error["index"]], "error": write_error["errmsg"]})
+
+    index = 0
+    async for record, error in records:
+        if error is None:
+            try:
+                document = RawBSONDocument(bson.encode({"_id": ObjectId(), **parse(record)}))
+            except (ValueError, TypeError) as e:
+                error = str(e)
+        if error is not None:
+            errors.append({"index": index, "error": error})
+            index += 1
+            continue
+
+        if batch and size + len(document.raw) > batch_bytes:
+            await flush()
+            batch, indexes, size = [], [], 0
+        batch.append(document)
+        indexes.append(index)
+        size += len(document.raw)
+        index += 1
+        if len(batch) >= batch_size:
+            await flush()
+            batch, indexes, size = [], [], 0
+
+    if batch:
+        await flush()
+    errors.sort(key=lambda e: e["index"])
+    return inserted, errors
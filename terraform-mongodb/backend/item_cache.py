@@ -0,0 +1,178 @@
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStore:
+    """Serialized items held in this worker, LRU-bounded with a TTL."""
+
+    shared = False
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisStore:
+    """Serialized items shared by every replica through Redis.
+
+    A delete leaves a short-lived empty marker in place of the item. Fills use
+    SET NX, so a replica whose read started before the delete can't put the
+    old document back; reads treat the marker as a miss.
+    Requires the optional ``redis`` package.
+    """
+
+    shared = True
+
+    def __init__(self, client, ttl=60, invalidation_grace=5, prefix="items:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.invalidation_grace = invalidation_grace
+        self.prefix = prefix
+        self.evictions = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("ITEM_CACHE_BACKEND=redis requires the 'redis' package")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key) or None
+
+    async def set(self, key, value):
+        await self.client.set(self.prefix + key, value, ex=self.ttl, nx=True)
+
+    async def delete(self, key):
+        await self.client.set(self.prefix + key, b"", ex=self.invalidation_grace)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ItemCache:
+    """Read-through cache of serialized items with single-flight loading.
+
+    Concurrent misses on the same key share one ``load()`` call. Anything that
+    changes or removes an item must call ``invalidate`` after the write; a
+    load that overlaps an invalidation is returned but not cached. If the
+    store is unavailable, reads fall through to ``load()`` uncached.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.invalidation_failures = 0
+        self._inflight = {}
+        self._epoch = 0
+
+    async def get(self, key, load):
+        try:
+            value = await self.store.get(key)
+        except Exception as e:
+            logger.warning(f"Item cache read failed, loading uncached: {str(e)}")
+            value = None
+        if value is not None:
+            self.hits += 1
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so one cancelled waiter doesn't cancel the load for the rest
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        epoch = self._epoch
+        try:
+            value = await load()
+            if value is not None and epoch == self._epoch:
+                await self._fill(key, value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved; there may be no waiters to see it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        return value
+
+    async def _fill(self, key, value):
+        # The item was read fine; a failed cache write must not fail the request
+        try:
+            await self.store.set(key, value)
+        except Exception as e:
+            logger.warning(f"Item cache write failed: {str(e)}")
+
+    async def invalidate(self, key):
+        self.invalidations += 1
+        self._epoch += 1
+        # Later readers must not join a load that may predate the write
+        self._inflight.pop(key, None)
+        # The write already happened; a failed delete must not fail the request.
+        # The entry then lives until its TTL expires
+        try:
+            await self.store.delete(key)
+        except Exception as e:
+            self.invalidation_failures += 1
+            logger.warning(f"Item cache invalidation failed: {str(e)}")
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "backend": "redis" if self.store.shared else "local",
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.store.evictions,
+            "invalidations": self.invalidations,
+            "invalidation_failures": self.invalidation_failures,
+            # Entries in this worker; not tracked for the shared store
+            "size": None if self.store.shared else len(self.store),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
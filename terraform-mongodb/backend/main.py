@@ -1,19 +1,141 @@
-from fastapi import FastAPI, HTTPException
-from pymongo import MongoClient
-from pydantic import BaseModel
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, monitoring
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+from bulk_import import NDJSON_TYPES, insert_records, iter_list, iter_ndjson
+from item_cache import ItemCache, LocalStore, RedisStore
+from profiling import install_profiler
+from serialization import MongoJSONResponse, dumps
+from server_timing import RouteStats, authorized, finish_request, record, start_request
+from tracing import configure_tracing, configure_logging
+import logging
 import os
 from dotenv import load_dotenv
 import uvicorn
 
 load_dotenv()
 
-app = FastAPI(title="MongoDB API")
+# Log lines written inside a traced request carry its trace ID
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
 
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client.get_database("mydatabase")
+MONGO_DB = os.getenv("MONGO_DB", "mydatabase")
+# Connections per worker process; each uvicorn worker has its own pool
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+# POST /items/bulk: documents and encoded bytes per insert_many call
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_BATCH_BYTES = int(os.getenv("BULK_BATCH_BYTES", str(8 * 1024 * 1024)))
+# GET /items/: default and maximum page size, and cursor batch size for NDJSON exports
+ITEMS_PAGE_SIZE = int(os.getenv("ITEMS_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# GET /items/{item_id} cache: local (per worker), redis (shared by replicas) or off
+ITEM_CACHE_BACKEND = os.getenv("ITEM_CACHE_BACKEND", "local")
+ITEM_CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", "10000"))
+ITEM_CACHE_TTL = int(os.getenv("ITEM_CACHE_TTL", "60"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Server-Timing header (mongo and serialize phases) and requests per route kept for /timing/stats
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "true").lower() == "true"
+SERVER_TIMING_WINDOW = int(os.getenv("SERVER_TIMING_WINDOW", "1000"))
+# Bearer token for /timing/stats; the route is hidden (404) without one
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+ITEM_FIELDS = {"name", "description", "price", "quantity"}
+
+# Serve the GET /items/ filters; _id order comes from the default _id index
+ITEM_INDEXES = [
+    [("name", ASCENDING), ("_id", ASCENDING)],
+    [("price", ASCENDING)],
+    [("quantity", ASCENDING)],
+]
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Adds each MongoDB command's round trip to the request's mongo phase.
+
+    Motor runs commands on executor threads with a copy of the request's
+    context, so ``record`` finds the right request.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record("mongo", event.duration_micros / 1e6)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Created per worker after the fork, on the worker's own event loop
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        event_listeners=[MongoCommandTimer()],
+    )
+    app.state.db = client.get_database(MONGO_DB)
+    try:
+        # No-op when the indexes already exist
+        for keys in ITEM_INDEXES:
+            await app.state.db.items.create_index(keys)
+    except Exception as e:
+        logger.warning(f"Could not create item indexes: {str(e)}")
+
+    # Single-flight futures belong to this worker's event loop, so build it here too
+    if ITEM_CACHE_BACKEND == "redis":
+        app.state.item_cache = ItemCache(RedisStore.from_url(REDIS_URL, ttl=ITEM_CACHE_TTL))
+    elif ITEM_CACHE_BACKEND == "local":
+        app.state.item_cache = ItemCache(LocalStore(ITEM_CACHE_SIZE, ITEM_CACHE_TTL))
+    else:
+        app.state.item_cache = None
+    yield
+    if app.state.item_cache is not None:
+        await app.state.item_cache.store.close()
+    client.close()
+
+app = FastAPI(title="MongoDB API", lifespan=lifespan)
+
+# GET /debug/profile, enabled by setting PROFILE_TOKEN
+install_profiler(app)
+
+route_timings = RouteStats(window=SERVER_TIMING_WINDOW)
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    start_request()
+    response = await call_next(request)
+    timing = finish_request()
+    # The matched route's template, so /items/{item_id} is one entry
+    route = request.scope.get("route")
+    route_timings.observe(f"{request.method} {route.path if route else 'unmatched'}", timing.total, timing.phases)
+    if SERVER_TIMING_HEADER:
+        response.headers["Server-Timing"] = timing.header()
+    return response
+
+# Opt-in tracing (TRACING_ENABLED=true): request spans plus a span per Mongo
+# command. Motor runs pymongo on threads that inherit the request's context,
+# and the command listener applies to clients created later in lifespan.
+if configure_tracing("items-api"):
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.pymongo import PymongoInstrumentor
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="debug/profile")
+    PymongoInstrumentor().instrument()
+
+def get_db(request: Request):
+    return request.app.state.db
 
 class Item(BaseModel):
     name: str
@@ -26,46 +148,186 @@ async def root():
     return {"message": "MongoDB API is running"}
 
 @app.post("/items/", response_model=Item)
-async def create_item(item: Item):
+async def create_item(item: Item, request: Request):
+    db = get_db(request)
+    try:
+        # insert_one adds the generated _id to the document; no need to read it back
+        document = item.dict()
+        result = await db.items.insert_one(document)
+        return {**document, "_id": str(result.inserted_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def parse_item(record):
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
     try:
-        result = db.items.insert_one(item.dict())
-        created_item = db.items.find_one({"_id": result.inserted_id})
-        return {**created_item, "_id": str(created_item["_id"])}
+        return Item(**record).dict()
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+@app.post("/items/bulk")
+async def create_items_bulk(request: Request):
+    """Insert items from a JSON array or an NDJSON stream.
+
+    NDJSON is read as it arrives, so memory is bounded by one batch however
+    large the upload. Invalid or rejected documents are reported by their
+    position in the input and don't stop the rest.
+    """
+    db = get_db(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        records = iter_ndjson(request.stream(), BULK_BATCH_BYTES)
+    else:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array or an NDJSON body")
+        records = iter_list(data)
+
+    try:
+        inserted, errors = await insert_records(db.items, records, parse_item, BULK_BATCH_SIZE, BULK_BATCH_BYTES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+def item_query(name, min_price, max_price, min_quantity, max_quantity, after):
+    query = {}
+    if name is not None:
+        query["name"] = name
+    for field, low, high in (("price", min_price, max_price), ("quantity", min_quantity, max_quantity)):
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds["$lte"] = high
+        if bounds:
+            query[field] = bounds
+    if after is not None:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="after must be an item id")
+    return query
+
+def item_projection(fields):
+    if fields is None:
+        return None
+    names = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = names - ITEM_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # _id is always returned; it is the pagination cursor
+    return {field: 1 for field in names}
 
-@app.get("/items/", response_model=List[Item])
-async def read_items():
+async def export_ndjson(cursor):
+    # The driver fetches EXPORT_BATCH_SIZE documents at a time, so memory stays
+    # flat whatever the collection size
+    async for item in cursor:
+        yield dumps(item) + b"\n"
+
+@app.get("/items/")
+async def read_items(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """List items in _id order, one page at a time.
+
+    The next page's cursor is returned in the X-Next-Cursor and Link headers.
+    ``format=ndjson`` streams every matching item instead (up to ``limit`` if given).
+    """
+    db = get_db(request)
+    query = item_query(name, min_price, max_price, min_quantity, max_quantity, after)
+    cursor = db.items.find(query, item_projection(fields)).sort("_id", ASCENDING)
+
+    if format == "ndjson":
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(export_ndjson(cursor.batch_size(EXPORT_BATCH_SIZE)),
+                                 media_type="application/x-ndjson")
+
+    limit = limit or ITEMS_PAGE_SIZE
     try:
-        items = list(db.items.find())
-        for item in items:
-            item["_id"] = str(item["_id"])
-        return items
+        items = await cursor.limit(limit + 1).to_list(length=limit + 1)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {}
+    if len(items) > limit:
+        items = items[:limit]
+        # Keyset cursor: the last _id on this page
+        next_cursor = str(items[-1]["_id"])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(after=next_cursor)}>; rel="next"'
+    # Documents written through this API are already valid Items
+    return MongoJSONResponse(items, headers=headers)
+
+def parse_item_id(item_id):
+    try:
+        return ObjectId(item_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid item id")
+
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    item_cache = request.app.state.item_cache
+    if item_cache is None:
+        raise HTTPException(status_code=404, detail="Item cache is disabled")
+    return item_cache.stats()
+
+@app.get("/timing/stats")
+async def timing_stats(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(request.headers.get("Authorization"), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    # Percentiles for the worker that answers this request
+    return route_timings.summary()
+
 @app.get("/items/{item_id}")
-async def read_item(item_id: str):
+async def read_item(item_id: str, request: Request):
+    db = get_db(request)
+    object_id = parse_item_id(item_id)
+
+    async def load():
+        item = await db.items.find_one({"_id": object_id})
+        return dumps(item) if item is not None else None
+
+    item_cache = request.app.state.item_cache
     try:
-        from bson.objectid import ObjectId
-        item = db.items.find_one({"_id": ObjectId(item_id)})
-        if item:
-            item["_id"] = str(item["_id"])
-            return item
-        raise HTTPException(status_code=404, detail="Item not found")
+        body = await (item_cache.get(str(object_id), load) if item_cache is not None else load())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if body is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    # Cached bodies are already serialized
+    return Response(body, media_type="application/json")
 
 @app.delete("/items/{item_id}")
-async def delete_item(item_id: str):
+async def delete_item(item_id: str, request: Request):
+    db = get_db(request)
+    object_id = parse_item_id(item_id)
     try:
-        from bson.objectid import ObjectId
-        result = db.items.delete_one({"_id": ObjectId(item_id)})
-        if result.deleted_count:
-            return {"message": "Item deleted successfully"}
-        raise HTTPException(status_code=404, detail="Item not found")
+        result = await db.items.delete_one({"_id": object_id})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
-    
+        raise HTTPException(status_code=500, detail=str(e))
+    # Any route that changes an item must invalidate it like this, after the
+    # write; cache store failures are logged and counted, not raised
+    if request.app.state.item_cache is not None:
+        await request.app.state.item_cache.invalidate(str(object_id))
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return {"message": "Item deleted successfully"}
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=5001)
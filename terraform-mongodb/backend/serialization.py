@@ -0,0 +1,30 @@
+from bson.objectid import ObjectId
+from fastapi.responses import JSONResponse
+import orjson
+
+from server_timing import phase
+
+
+def default(obj):
+    # orjson handles datetime, UUID and the JSON types itself and calls this
+    # only for the rest
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize Mongo documents (ObjectId included) straight to JSON bytes."""
+    with phase("serialize"):
+        return orjson.dumps(content, default=default)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response for documents read from Mongo.
+
+    Returning it from a route skips FastAPI's response_model validation and
+    jsonable_encoder pass, so use it for data the API itself wrote.
+    """
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Microbenchmark: cost per document of turning Mongo documents into a response body.
+
+  stdlib    the old path: convert each _id by hand, validate against
+            List[Item], encode with jsonable_encoder and json.dumps
+  orjson    MongoJSONResponse: one orjson.dumps call, ObjectId handled by
+            its default hook, no re-validation
+
+Item only declares the user-supplied fields, so the stdlib path carries _id
+and created_at past validation. Both paths then encode the same payload,
+which is checked before timing.
+
+No database is needed; documents are generated in memory.
+
+  python serialization_benchmark.py --sizes 1 100 10000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from main import Item
+from serialization import dumps
+
+ITEMS = TypeAdapter(List[Item])
+
+
+def make_documents(count):
+    return [
+        {"_id": ObjectId(), "name": f"item-{i}", "description": "A test item",
+         "price": i * 0.5, "quantity": i, "created_at": datetime.now(timezone.utc)}
+        for i in range(count)
+    ]
+
+
+def stdlib_path(documents):
+    items = [dict(document) for document in documents]
+    for item in items:
+        item["_id"] = str(item["_id"])
+    validated = ITEMS.validate_python(items)
+    payload = []
+    for item, model in zip(items, validated):
+        fields = model.model_dump()
+        payload.append({key: fields.get(key, value) for key, value in item.items()})
+    # Same settings as starlette's JSONResponse.render
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_path(documents):
+    return dumps(documents)
+
+
+def measure(fn, documents, min_seconds):
+    # Repeat until the run is long enough to time reliably
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        fn(documents)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / runs / len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization cost per document")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000],
+                        help="Documents per response")
+    parser.add_argument("--min-seconds", type=float, default=0.5,
+                        help="Minimum time spent on each measurement")
+    args = parser.parse_args()
+
+    print(f"{'documents':>10} {'stdlib us/doc':>15} {'orjson us/doc':>15} {'speedup':>8}")
+    for size in args.sizes:
+        documents = make_documents(size)
+        if json.loads(stdlib_path(documents)) != json.loads(orjson_path(documents)):
+            raise SystemExit("stdlib and orjson paths encode different payloads")
+        before = measure(stdlib_path, documents, args.min_seconds)
+        after = measure(orjson_path, documents, args.min_seconds)
+        print(f"{size:>10} {before * 1e6:>15.2f} {after * 1e6:>15.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
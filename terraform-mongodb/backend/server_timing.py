@@ -0,0 +1,145 @@
+"""Per-request phase timings for the ``Server-Timing`` response header.
+
+The app calls ``start_request()`` when a request arrives. Code on the request
+path wraps its work in ``phase(name)``, or calls ``record(name, seconds)`` from
+a hook that has already timed it (SQL events, database command listeners).
+When the response is ready, ``finish_request()`` returns the request's
+``Timing``. Its ``header()`` goes into ``Server-Timing``, and the timing is
+passed to ``RouteStats.observe`` for the per-route summary. Apps serve that
+summary only to callers for whom ``authorized()`` is true.
+
+The active timing lives in a ContextVar, so phases recorded by asyncio tasks
+or executor threads that run with a copy of the request's context are added
+to the right request. Outside a request, ``phase`` and ``record`` do nothing.
+Phases can overlap and need not add up to the total. All durations come from
+``time.perf_counter``.
+
+Copied from shared/server_timing.py by shared/sync.py; edit that file.
+"""
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hmac
+import math
+import os
+import threading
+import time
+
+_current = ContextVar("server_timing", default=None)
+
+
+class Timing:
+    """Seconds spent per named phase during one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def finish(self):
+        if self.total is None:
+            self.total = time.perf_counter() - self.started
+        return self.total
+
+    def header(self):
+        """The ``Server-Timing`` value, e.g. ``db;dur=3.21, serialize;dur=0.40, total;dur=5.12``."""
+        metrics = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        metrics.append(f"total;dur={self.finish() * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+def start_request():
+    timing = Timing()
+    _current.set(timing)
+    return timing
+
+
+def finish_request():
+    """Stop the current request's clock; returns its Timing, or None if none was started."""
+    timing = _current.get()
+    if timing is not None:
+        _current.set(None)
+        timing.finish()
+    return timing
+
+
+def record(name, seconds):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def phase(name):
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def authorized(authorization, token):
+    """True if an ``Authorization`` header value is ``Bearer <token>``."""
+    scheme, _, supplied = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def percentile(ordered, fraction):
+    # Nearest rank over an already sorted list
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+class RouteStats:
+    """Rolling percentiles of the total and of each phase, per route, over
+    the last ``window`` requests of that route in this process.
+
+    Routes should be templates (``GET /items/{item_id}``), not raw paths, so
+    the number of routes stays bounded.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, total, phases=None):
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None:
+                samples = self._samples[route] = deque(maxlen=self.window)
+            samples.append((total, dict(phases or {})))
+
+    def summary(self):
+        with self._lock:
+            snapshot = {route: list(samples) for route, samples in self._samples.items()}
+        routes = {}
+        for route, samples in sorted(snapshot.items()):
+            values = {"total": [total for total, _ in samples]}
+            for _, phases in samples:
+                for name, seconds in phases.items():
+                    values.setdefault(name, []).append(seconds)
+            routes[route] = {
+                "requests": len(samples),
+                "phases": {name: summarize(durations, len(samples)) for name, durations in values.items()},
+            }
+        return {"pid": os.getpid(), "window": self.window, "routes": routes}
+
+
+def summarize(durations, requests):
+    ordered = sorted(durations)
+    return {
+        # Share of the route's requests that had this phase at all
+        "share": len(ordered) / requests,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }